@@ -6,8 +6,9 @@ except ImportError:
     # If eventlet is not installed, we might be running with gevent or standard threads
     pass
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import json
 import logging
 
 import os
@@ -81,6 +82,32 @@ def require_api_key():
     return None
 
 
+def sse_response(chunks, **final):
+    """
+    Stream text chunks as Server-Sent Events: one {"delta": ...} event per
+    chunk, then {"done": true, "reply": <full text>, **final}. If `chunks`
+    raises, the last event is {"error": ..., **final} instead, so clients
+    don't take a truncated reply for a complete one.
+    """
+    def events():
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield f"data: {json.dumps({'delta': chunk})}\n\n"
+        except Exception as e:
+            # Headers are already sent, so the error goes out as the last event
+            yield f"data: {json.dumps({'error': str(e), **final})}\n\n"
+            return
+        yield f"data: {json.dumps({'done': True, 'reply': ''.join(parts), **final})}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ---- Wordle Code (Unchanged) ---- #
 @app.route("/api/solve", methods=["POST"])
 @app.route("/api/wordle/solve", methods=["POST"])
@@ -100,6 +127,37 @@ def solve():
     return process_wordle_request(data)
 
 
+@app.route("/api/solve_batch", methods=["POST"])
+@app.route("/api/wordle/solve_batch", methods=["POST"])
+def solve_batch():
+    """
+    Batch Wordle endpoint: solves a list of game histories in one request.
+    """
+    auth_error = require_api_key()
+    if auth_error:
+        return auth_error
+
+    from wordle_solver import process_wordle_batch
+
+    data = request.get_json(silent=True) or {}
+
+    return process_wordle_batch(data)
+
+
+@app.get("/api/wordle/stats")
+def wordle_stats():
+    """
+    Hit/miss counters for the Wordle state caches.
+    """
+    auth_error = require_api_key()
+    if auth_error:
+        return auth_error
+
+    from wordle_solver import cache_stats
+
+    return jsonify(cache_stats())
+
+
 # ---- Chatbot Code ---- #
 @app.route("/api/chat", methods=["POST"])
 def chat():
@@ -121,6 +179,10 @@ def chat():
     if not user_message:
         return jsonify({"error": "Message cannot be empty."}), 400
 
+    if data.get("stream"):
+        from chatbot import stream_message
+        return sse_response(stream_message(user_message, session_id))
+
     from chatbot import process_message
 
     # Call the chatbot logic
@@ -129,6 +191,20 @@ def chat():
     return jsonify({"reply": response_message})
 
 
+@app.get("/api/chat/stats")
+def chat_stats():
+    """
+    Database pool metrics for the chatbot.
+    """
+    auth_error = require_api_key()
+    if auth_error:
+        return auth_error
+
+    from chatbot import chat_stats
+
+    return jsonify(chat_stats())
+
+
 @app.route("/api/manipulate", methods=["POST"])
 def manipulate():
     auth_error = require_api_key()
@@ -226,6 +302,10 @@ def generate():
     if not prompt:
         return jsonify({"error": "Missing prompt"}), 400
 
+    if data.get("stream"):
+        from chatbot import stream_message  # lazy import
+        return sse_response(stream_message(prompt, session_id), session_id=session_id)
+
     from chatbot import process_message  # lazy import
     response_message = process_message(prompt, session_id)
 
@@ -246,16 +326,33 @@ def sql_qa_route():
     question = (data.get("question") or data.get("prompt") or "").strip()
     session_id = data.get("session_id") or "default-sql-session"
     max_rows = int(data.get("max_rows") or 50)
+    candidates = int(data.get("candidates") or 0) or None  # None = SQL_QA_CANDIDATES
 
     if not question:
         return jsonify({"error": "Missing question"}), 400
 
+    if data.get("stream"):
+        def lines():
+            try:
+                from sql_qa import sql_qa_stream  # lazy import
+                for message in sql_qa_stream(question, session_id, max_rows, candidates):
+                    yield json.dumps(message) + "\n"
+            except Exception as e:
+                # Headers are already sent, so the error goes out as the last line
+                yield json.dumps({"error": f"Crash in SQL QA: {str(e)}"}) + "\n"
+
+        return Response(
+            stream_with_context(lines()),
+            mimetype="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
     try:
         from sql_qa import sql_qa
         # TEST: Just import to verify
         # return jsonify({"status": "SQL QA Imported OK"}) 
 
-        result = sql_qa(question=question, session_id=session_id, max_rows=max_rows)
+        result = sql_qa(question=question, session_id=session_id, max_rows=max_rows, candidates=candidates)
         if "error" in result:
              return jsonify(result), 400
         return jsonify(result)
@@ -264,15 +361,66 @@ def sql_qa_route():
         return jsonify({"error": f"Crash in SQL QA: {str(e)}"}), 500
 
 
+@app.get("/api/sql_qa/stats")
+def sql_qa_stats():
+    """
+    Cache and connection pool metrics for SQL Q&A.
+    """
+    auth_error = require_api_key()
+    if auth_error:
+        return auth_error
+
+    from sql_qa import sql_qa_stats
+
+    return jsonify(sql_qa_stats())
+
+
+@app.get("/api/azure_live/stats")
+def azure_live_stats():
+    """
+    Per-session audio ingestion and caption counters for the live translation namespace.
+    """
+    auth_error = require_api_key()
+    if auth_error:
+        return auth_error
+
+    if azure_live_namespace is None:
+        return jsonify({"error": "Live translation is not available."}), 503
+    return jsonify(azure_live_namespace.stats())
+
+
 # ✅ NEW: Register your live translation namespace (ONLY file you have: services/azure_live_ws.py)
 # This must happen after socketio is created.
+azure_live_namespace = None
 try:
     from services.azure_live_ws import AzureLiveNamespace
-    socketio.on_namespace(AzureLiveNamespace("/azure-live"))
+    azure_live_namespace = AzureLiveNamespace("/azure-live")
+    socketio.on_namespace(azure_live_namespace)
     logging.info("Registered AzureLiveNamespace at /azure-live")
 except Exception as e:
     logging.exception("Failed to register AzureLiveNamespace: %s", e)
 
+try:
+    from services.chat_stream_ws import ChatStreamNamespace
+    socketio.on_namespace(ChatStreamNamespace("/chat-stream"))
+    logging.info("Registered ChatStreamNamespace at /chat-stream")
+except Exception as e:
+    logging.exception("Failed to register ChatStreamNamespace: %s", e)
+
+# Render the SQL Q&A schema now rather than on the first question
+try:
+    from sql_qa import warm_schema_cache
+    warm_schema_cache()
+except Exception as e:
+    logging.exception("Failed to precompute SQL QA schema: %s", e)
+
+# Load the Wordle pattern table in the background rather than in the first solve request
+try:
+    from wordle_solver import warm_pattern_matrix
+    warm_pattern_matrix()
+except Exception as e:
+    logging.exception("Failed to start loading the Wordle pattern table: %s", e)
+
 
 # ---- Main ---- #
 # For local dev only. In production you run gunicorn via systemd (as you already do).
@@ -0,0 +1,176 @@
+"""
+Audio ingestion for live recognition: per-session ring buffer and coalescing.
+
+Browsers send microphone audio in small frames (often 20-40 ms each), and
+writing each one straight to the Speech SDK's PushAudioInputStream costs a
+call and a copy per frame. AudioIngest copies each frame into a fixed
+bytearray ring through a memoryview, with no intermediate bytes object, and
+writes to the stream in `flush_ms` blocks (100 ms by default). At most
+`max_buffer_ms` of audio is held. When the stream falls behind, the oldest
+audio is dropped and counted, so recognition stays close to live instead of
+lagging further. Only one thread writes to the stream at a time. A frame
+that arrives during a write is buffered and sent by the thread already writing.
+"""
+import logging
+import threading
+import time
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity FIFO of bytes. write() overwrites the oldest data when full.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self.size = 0
+
+    def write(self, data: memoryview) -> int:
+        """
+        Append `data`; returns how many of the oldest bytes were overwritten.
+        """
+        n = len(data)
+        if n >= self.capacity:
+            dropped = self.size + n - self.capacity
+            self._view[:] = data[n - self.capacity:]
+            self._start, self.size = 0, self.capacity
+            return dropped
+        dropped = max(0, self.size + n - self.capacity)
+        if dropped:
+            self.discard(dropped)
+        end = (self._start + self.size) % self.capacity
+        first = min(n, self.capacity - end)
+        self._view[end:end + first] = data[:first]
+        if first < n:
+            self._view[:n - first] = data[first:]
+        self.size += n
+        return dropped
+
+    def discard(self, n: int) -> None:
+        n = min(n, self.size)
+        self._start = (self._start + n) % self.capacity
+        self.size -= n
+
+    def read(self, n: int) -> bytes:
+        """
+        Remove and return up to n of the oldest bytes.
+        """
+        n = min(n, self.size)
+        end = self._start + n
+        if end <= self.capacity:
+            out = bytes(self._view[self._start:end])
+        else:
+            out = bytes(self._view[self._start:]) + bytes(self._view[:end - self.capacity])
+        self.discard(n)
+        return out
+
+
+class AudioIngest:
+    """
+    Args:
+        sample_rate (int): Samples per second of the incoming PCM.
+        sample_bytes (int): Bytes per sample (all channels); drops keep this alignment.
+        flush_ms (int): Audio written to the stream per call.
+        max_buffer_ms (int): Audio held before the oldest is dropped.
+    """
+
+    def __init__(self, sample_rate=16000, sample_bytes=2, flush_ms=100, max_buffer_ms=2000):
+        self.sample_bytes = sample_bytes
+        self.bytes_per_ms = sample_rate * sample_bytes / 1000
+        self.flush_bytes = max(sample_bytes, int(self.bytes_per_ms * flush_ms) // sample_bytes * sample_bytes)
+        capacity = max(self.flush_bytes, int(self.bytes_per_ms * max_buffer_ms) // sample_bytes * sample_bytes)
+
+        self._ring = AudioRingBuffer(capacity)
+        self._lock = threading.Lock()
+        self._writing = False
+        self._stream = None
+
+        self.started = time.monotonic()
+        self.chunks = 0
+        self.bytes_in = 0
+        self.writes = 0
+        self.bytes_written = 0
+        self.drops = 0
+        self.bytes_dropped = 0
+        self.write_errors = 0
+        self.max_buffered_bytes = 0
+
+    def attach(self, stream) -> None:
+        """
+        Send audio to `stream` (a PushAudioInputStream) from now on.
+        """
+        with self._lock:
+            self._stream = stream
+            self._ring.discard(self._ring.size)
+
+    def detach(self) -> None:
+        """
+        Write what is buffered to the current stream and stop sending to it.
+        """
+        self._drain(final=True)
+        with self._lock:
+            self._stream = None
+
+    def feed(self, chunk) -> bool:
+        """
+        Buffer a frame (bytes, bytearray or memoryview) and write whole
+        flush_ms blocks. Returns False if no stream is attached.
+        """
+        view = memoryview(chunk).cast("B")
+        with self._lock:
+            if self._stream is None:
+                return False
+            self.chunks += 1
+            self.bytes_in += len(view)
+            dropped = self._ring.write(view)
+            if dropped:
+                # Keep sample alignment: round the drop up to a whole sample
+                extra = -dropped % self.sample_bytes
+                self._ring.discard(extra)
+                self.drops += 1
+                self.bytes_dropped += dropped + extra
+            self.max_buffered_bytes = max(self.max_buffered_bytes, self._ring.size)
+        self._drain()
+        return True
+
+    def _drain(self, final=False) -> None:
+        while True:
+            with self._lock:
+                if self._writing or self._stream is None:
+                    return  # the thread writing now picks up what was just buffered
+                if self._ring.size >= self.flush_bytes:
+                    block = self._ring.read(self.flush_bytes)
+                elif final and self._ring.size:
+                    block = self._ring.read(self._ring.size)
+                else:
+                    return
+                stream = self._stream
+                self._writing = True
+            try:
+                stream.write(block)
+                self.writes += 1
+                self.bytes_written += len(block)
+            except Exception as e:
+                self.write_errors += 1
+                logging.info(f"Audio stream write of {len(block)} bytes failed: {e}")
+            finally:
+                with self._lock:
+                    self._writing = False
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "chunks": self.chunks,
+            "bytes_in": self.bytes_in,
+            "writes": self.writes,
+            "bytes_written": self.bytes_written,
+            "bytes_per_second": round(self.bytes_in / elapsed, 1),
+            "drops": self.drops,
+            "dropped_ms": round(self.bytes_dropped / self.bytes_per_ms, 1),
+            "buffered_ms": round(self._ring.size / self.bytes_per_ms, 1),
+            "max_buffered_ms": round(self.max_buffered_bytes / self.bytes_per_ms, 1),
+            "write_errors": self.write_errors,
+        }
@@ -0,0 +1,153 @@
+"""
+Per-session ordering of live captions and their translations.
+
+The recognizer callbacks used to translate each final result inline, so a
+slow Translator call held up the SDK's event thread and every caption behind
+it. CaptionPipeline hands translation to TranslatorClient.submit() and
+returns at once. Finals are numbered (seq) and their translations are
+emitted strictly in seq order, however the requests complete. Emits are
+serialized per session: whichever thread finds the session idle sends
+everything queued, so callbacks never wait on another thread's emit. Only
+the newest unsent partial is kept, so a backed-up client skips stale partials
+instead of receiving them late. Finals and translations are never dropped,
+except that a session with `max_pending` translations in flight leaves new
+finals untranslated.
+
+Callers are the SDK's OS threads and the translator's workers, so state is
+guarded by an OS lock (green.OSLock), and emits go through `dispatch`
+(green.call_in_hub under eventlet) to run on the hub that owns the socket.
+"""
+import logging
+import time
+from collections import deque
+
+import green
+
+
+class CaptionPipeline:
+    """
+    Args:
+        emit (callable): emit(event, payload) to this session's client.
+        submit_translation (callable): submit(text, src, tgt, callback), e.g. translator.submit.
+        max_pending (int): Translations in flight before new finals are left untranslated.
+        dispatch (callable): dispatch(fn) runs fn where emits are safe; None runs it at once.
+    """
+
+    def __init__(self, emit, submit_translation, max_pending=8, dispatch=None):
+        self._emit = emit
+        self._submit = submit_translation
+        self._dispatch = dispatch or (lambda fn: fn())
+        self.max_pending = max_pending
+
+        self._lock = green.OSLock()
+        self._emitting = False
+        self._outbox = deque()  # (event, payload) in emit order; never dropped
+        self._partial = None  # newest partial not yet emitted
+        self._seq = 0  # seq of the utterance being recognized
+        self._translated = {}  # seq -> translation ("" = none) waiting for earlier seqs
+        self._next_translation = 0  # lowest seq whose translation is not emitted yet
+        self._pending = 0
+
+        self.partials = 0
+        self.partials_dropped = 0
+        self.finals = 0
+        self.translations = 0
+        self.translations_skipped = 0
+        self.translation_ms_max = 0.0
+        self.emit_errors = 0
+
+    def send(self, event: str, payload: dict) -> None:
+        """
+        Queue any other event (e.g. lang_detected) behind what is already queued.
+        """
+        with self._lock:
+            self._outbox.append((event, payload))
+        self._dispatch(self._flush)
+
+    def partial(self, text: str) -> None:
+        with self._lock:
+            self.partials += 1
+            if self._partial is not None:
+                self.partials_dropped += 1
+            self._partial = {"seq": self._seq, "text": text}
+        self._dispatch(self._flush)
+
+    def final(self, text: str, src: str, tgt: str) -> None:
+        """
+        Emit a final result and translate it in the background.
+        """
+        started = time.monotonic()
+        with self._lock:
+            seq = self._seq
+            self._seq += 1
+            self.finals += 1
+            # The final supersedes a partial of the same utterance that was never sent
+            if self._partial is not None:
+                self.partials_dropped += 1
+                self._partial = None
+            self._outbox.append(("final_result", {"seq": seq, "text": text}))
+            translate = bool(text) and self._pending < self.max_pending
+            if translate:
+                self._pending += 1
+            else:
+                if text:
+                    self.translations_skipped += 1
+                self._translated[seq] = ""
+                self._release_translations()
+        if translate:
+            self._submit(text, src, tgt, lambda translation: self._on_translation(seq, translation, started))
+        self._dispatch(self._flush)
+
+    def _on_translation(self, seq: int, translation: str, started: float) -> None:
+        with self._lock:
+            self._pending -= 1
+            self.translation_ms_max = max(self.translation_ms_max, (time.monotonic() - started) * 1000)
+            self._translated[seq] = translation
+            self._release_translations()
+        self._dispatch(self._flush)
+
+    def _release_translations(self) -> None:
+        # Caller holds the lock. Move translations that are next in seq order to the outbox.
+        while self._next_translation in self._translated:
+            seq = self._next_translation
+            translation = self._translated.pop(seq)
+            if translation:
+                self.translations += 1
+                self._outbox.append(("final_translation", {"seq": seq, "translation": translation}))
+            self._next_translation += 1
+
+    def _flush(self) -> None:
+        while True:
+            with self._lock:
+                if self._emitting:
+                    return  # the thread emitting now sends what we queued
+                if self._outbox:
+                    event, payload = self._outbox.popleft()
+                elif self._partial is not None:
+                    event, payload = "partial_result", self._partial
+                    self._partial = None
+                else:
+                    return
+                self._emitting = True
+            try:
+                self._emit(event, payload)
+            except Exception as e:
+                self.emit_errors += 1
+                logging.info(f"Caption emit of {event} failed: {e}")
+            finally:
+                with self._lock:
+                    self._emitting = False
+
+    def stats(self):
+        return {
+            "seq": self._seq,
+            "queued": len(self._outbox),
+            "translations_pending": self._pending,
+            "partials": self.partials,
+            "partials_dropped": self.partials_dropped,
+            "finals": self.finals,
+            "translations": self.translations,
+            "translations_skipped": self.translations_skipped,
+            "translation_ms_max": round(self.translation_ms_max, 3),
+            "emit_errors": self.emit_errors,
+        }
@@ -1,9 +1,16 @@
-from openai import OpenAI
 import psycopg2
+from psycopg2.extras import execute_values
 from datetime import datetime
 import logging
 import os
 
+import green
+from context_window import ContextWindow, TokenCounter
+from db_pool import ConnectionPool
+from llm_gateway import gateway
+from session_cache import SessionHistoryCache
+from write_behind import WriteBehindQueue
+
 # Configure logging
 logging.basicConfig(
     filename="test_chatbot.log",  # Log file name
@@ -18,8 +25,8 @@ logging.basicConfig(
 #logging.error("This is an ERROR message.")
 #logging.critical("This is a CRITICAL message.")
 
-# Initialize the OpenAI client
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", ""))
+# OpenAI client shared with sql_qa; calls go through the gateway's concurrency cap and retries
+client = gateway.client
 
 # Database connection details
 DB_PARAMS = {
@@ -30,6 +37,97 @@ DB_PARAMS = {
     "port": os.environ.get("DB_PORT", "5432"),
 }
 
+# Under eventlet, let psycopg2 yield to other green threads while it waits on the server
+if green.is_green():
+    try:
+        from psycogreen.eventlet import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        logging.info("psycogreen not installed; database calls will block the eventlet hub")
+
+MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+
+# Add a system prompt to establish context
+SYSTEM_PROMPT = {
+    "role": "system",
+    "content": (
+        "You are a helpful assistant. Remember the user's name and key details "
+        "shared during the conversation."
+    )
+}
+
+MISSING_KEY_REPLY = "Server is missing OPENAI_API_KEY."
+ERROR_REPLY = "I'm sorry, I couldn't process your request at the moment. Please try again later."
+
+
+class StreamFailed(Exception):
+    """The model stream failed; the chunks already yielded are incomplete and were not saved."""
+
+# Prior turns considered for each message; CHAT_CONTEXT_TOKENS caps how many are sent
+HISTORY_TURNS = int(os.environ.get("CHAT_HISTORY_TURNS", "20"))
+CONTEXT_TOKENS = int(os.environ.get("CHAT_CONTEXT_TOKENS", "3000"))
+SUMMARY_TOKENS = int(os.environ.get("CHAT_SUMMARY_TOKENS", "300"))
+
+SUMMARY_PROMPT = {
+    "role": "system",
+    "content": (
+        "Update the running summary of a conversation with the new turns below. "
+        "Keep the user's name, preferences and any facts the assistant should "
+        "remember. Reply with the summary only, in a few sentences."
+    )
+}
+
+# Shared by get_conversation_history and save_message_to_db
+db_pool = ConnectionPool(
+    lambda: psycopg2.connect(connect_timeout=3, **DB_PARAMS),
+    max_size=int(os.environ.get("DB_POOL_SIZE", "5")),
+    wait_timeout=float(os.environ.get("DB_POOL_TIMEOUT", "5")),
+)
+
+def load_conversation_turns(session_id, limit=10):
+    """
+    Read the most recent turns for a session from the database, including
+    turns still waiting in the write-behind queue. Raises on database errors.
+
+    Returns:
+        list: (user_message, bot_reply) tuples, oldest first.
+    """
+    with db_pool.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT user_message, bot_reply, timestamp FROM conversation "
+                "WHERE session_id = %s ORDER BY timestamp DESC LIMIT %s",
+                (session_id, limit)
+            )
+            rows = cursor.fetchall()
+
+    # Turns still waiting in the write-behind queue are newer than anything stored
+    newest = rows[0][2] if rows else None
+    pending = [
+        row[1:] for row in conversation_writer.unwritten()
+        if row[0] == session_id and (newest is None or row[3] > newest)
+    ]
+    rows = (list(reversed(pending)) + rows)[:limit]
+
+    # Debugging: Log the retrieved history
+    logging.info(f"Retrieved Conversation History for session {session_id}:")
+    for row in rows:
+        logging.info(f"User: {row[0]}, Bot: {row[1]}")
+
+    return [(row[0], row[1]) for row in reversed(rows)]  # Reverse to maintain chronological order
+
+
+def format_history(turns):
+    """
+    Format (user_message, bot_reply) turns as messages for GPT.
+    """
+    messages = []
+    for user_message, bot_reply in turns:
+        messages.append({"role": "user", "content": user_message})
+        messages.append({"role": "assistant", "content": bot_reply})
+    return messages
+
+
 def get_conversation_history(session_id, limit=10):
     """
     Retrieve the most recent conversation history for a session.
@@ -42,30 +140,28 @@ def get_conversation_history(session_id, limit=10):
         list: A list of messages in the format required by OpenAI GPT.
     """
     try:
-        with psycopg2.connect(connect_timeout=3, **DB_PARAMS) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "SELECT user_message, bot_reply FROM conversation "
-                    "WHERE session_id = %s ORDER BY timestamp DESC LIMIT %s",
-                    (session_id, limit)
-                )
-                rows = cursor.fetchall()
-
-                # Debugging: Log the retrieved history
-                logging.info(f"Retrieved Conversation History for session {session_id}:")
-                for row in rows:
-                    logging.info(f"User: {row[0]}, Bot: {row[1]}")
+        return format_history(load_conversation_turns(session_id, limit))
+    except Exception as e:
+        logging.info(f"Error retrieving conversation history: {e}")
+        return []
 
-                # Format messages for GPT
-                messages = []
-                for row in reversed(rows):  # Reverse to maintain chronological order
-                    messages.append({"role": "user", "content": row[0]})
-                    messages.append({"role": "assistant", "content": row[1]})
 
-                return messages
+def get_session_turns(session_id):
+    """
+    Recent turns for a session from the in-process cache, falling back to
+    the database (and caching the result) on a miss.
+    """
+    turns = session_history.get(session_id)
+    if turns is not None:
+        return turns
+    try:
+        turns = load_conversation_turns(session_id, limit=HISTORY_TURNS)
     except Exception as e:
+        # Don't cache a failed read as an empty history
         logging.info(f"Error retrieving conversation history: {e}")
         return []
+    session_history.load(session_id, turns)
+    return turns
 
 
 def save_message_to_db(session_id, user_message, bot_reply):
@@ -78,7 +174,7 @@ def save_message_to_db(session_id, user_message, bot_reply):
         logging.info(f"User Message: {user_message}")
         logging.info(f"Bot Reply: {bot_reply}")
 
-        with psycopg2.connect(connect_timeout=3, **DB_PARAMS) as conn:
+        with db_pool.connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(
                     "INSERT INTO conversation (session_id, user_message, bot_reply, timestamp) VALUES (%s, %s, %s, %s)",
@@ -89,6 +185,101 @@ def save_message_to_db(session_id, user_message, bot_reply):
     except Exception as e:
         logging.info(f"Error saving message to database: {e}")
 
+
+def save_messages_to_db(rows):
+    """
+    Insert a batch of (session_id, user_message, bot_reply, timestamp) rows
+    with one multi-row INSERT. Used by the write-behind queue.
+    """
+    with db_pool.connection() as conn:
+        with conn.cursor() as cursor:
+            execute_values(
+                cursor,
+                "INSERT INTO conversation (session_id, user_message, bot_reply, timestamp) VALUES %s",
+                rows
+            )
+        conn.commit()
+    logging.info(f"Saved {len(rows)} messages to database.")
+
+
+# Conversation rows are persisted off the response path, in batches
+conversation_writer = WriteBehindQueue(
+    save_messages_to_db,
+    max_batch=int(os.environ.get("DB_WRITE_BATCH", "50")),
+    flush_interval=float(os.environ.get("DB_WRITE_INTERVAL", "0.5")),
+    max_backlog=int(os.environ.get("DB_WRITE_BACKLOG", "1000")),
+)
+
+
+# Recent turns per session, so most chat turns skip the history SELECT
+session_history = SessionHistoryCache(
+    max_turns=HISTORY_TURNS,
+    max_sessions=int(os.environ.get("CHAT_CACHE_SESSIONS", "1000")),
+    max_bytes=int(os.environ.get("CHAT_CACHE_BYTES", str(8 * 2 ** 20))),
+)
+
+
+def queue_message_for_db(session_id, user_message, bot_reply):
+    """
+    Hand the turn to the write-behind queue; if its backlog is full, save inline.
+    """
+    if not conversation_writer.submit((session_id, user_message, bot_reply, datetime.now())):
+        save_message_to_db(session_id, user_message, bot_reply)
+
+
+def summarize_turns(previous_summary, turns):
+    """
+    Fold (user_message, bot_reply) turns into a conversation summary.
+    Runs in the background for the context window.
+    """
+    lines = [f"Current summary: {previous_summary}"] if previous_summary else []
+    for user_message, bot_reply in turns:
+        lines.append(f"User: {user_message}")
+        lines.append(f"Assistant: {bot_reply}")
+
+    completion = gateway.complete(
+        [SUMMARY_PROMPT, {"role": "user", "content": "\n".join(lines)}],
+        model=MODEL,
+        max_tokens=SUMMARY_TOKENS
+    )
+    return completion.choices[0].message.content
+
+
+# Keeps prompts within CONTEXT_TOKENS; older turns are replaced by a rolling summary
+context_window = ContextWindow(
+    TokenCounter(MODEL),
+    CONTEXT_TOKENS,
+    summarize_turns,
+    max_sessions=int(os.environ.get("CHAT_CACHE_SESSIONS", "1000")),
+)
+
+
+def build_messages(user_message, session_id):
+    """
+    System prompt, summary of older turns, as much recent history as fits
+    the token budget and the new user message, in the format required by
+    OpenAI GPT.
+    """
+    # Retrieve recent conversation history for the session (cached in-process)
+    turns = get_session_turns(session_id)
+    messages = context_window.build(session_id, SYSTEM_PROMPT, turns, user_message)
+
+    # **Log the conversation history for debugging**
+    logging.info("Conversation History Sent to GPT:")
+    for msg in messages:
+        logging.info(f"{msg['role']}: {msg['content']}")
+
+    return messages
+
+
+def record_turn(session_id, user_message, bot_reply):
+    """
+    Save the conversation (session cache now, database batched in the background).
+    """
+    session_history.append(session_id, user_message, bot_reply)
+    queue_message_for_db(session_id, user_message, bot_reply)
+
+
 def process_message(user_message, session_id):
     """
     Process the user message, save the conversation to the database, and return a response.
@@ -101,43 +292,64 @@ def process_message(user_message, session_id):
         str: The chatbot's response from OpenAI GPT.
     """
     if not client.api_key:
-        return "Server is missing OPENAI_API_KEY."
+        return MISSING_KEY_REPLY
 
     try:
-        # Retrieve recent conversation history for the session
-        conversation_history = get_conversation_history(session_id, limit=20)
-
-        # Add a system prompt to establish context
-        system_prompt = {
-            "role": "system",
-            "content": (
-                "You are a helpful assistant. Remember the user's name and key details "
-                "shared during the conversation."
-            )
-        }
-
-        # Add the current user message to the context
-        conversation_history.append({"role": "user", "content": user_message})
-
-        # **Log the conversation history for debugging**
-        logging.info("Conversation History Sent to GPT:")
-        for msg in [system_prompt, *conversation_history]:
-            logging.info(f"{msg['role']}: {msg['content']}")
-
         # Call OpenAI GPT model with the conversation history
-        completion = client.chat.completions.create(
-            model=os.environ.get("OPENAI_MODEL", "gpt-4o-mini"),
-            messages=[system_prompt, *conversation_history]
-        )
+        completion = gateway.complete(build_messages(user_message, session_id), model=MODEL)
 
         # Extract the reply from the completion object
         message_content = completion.choices[0].message.content
 
-        # Save the conversation to the database
-        save_message_to_db(session_id, user_message, message_content)
+        record_turn(session_id, user_message, message_content)
 
         return message_content
 
     except Exception as e:
         logging.debug(f"Error communicating with OpenAI API: {e}")
-        return "I'm sorry, I couldn't process your request at the moment. Please try again later."
\ No newline at end of file
+        return ERROR_REPLY
+
+
+def stream_message(user_message, session_id):
+    """
+    Like process_message, but yields the reply in chunks as the model
+    produces them. The reply is saved only once the stream completes.
+
+    Args:
+        user_message (str): The message from the user.
+        session_id (str): The session ID for tracking conversations.
+
+    Yields:
+        str: Pieces of the chatbot's response, in order.
+
+    Raises:
+        StreamFailed: The model stream failed, possibly after some chunks.
+    """
+    if not client.api_key:
+        yield MISSING_KEY_REPLY
+        return
+
+    parts = []
+    try:
+        for delta in gateway.stream(build_messages(user_message, session_id), model=MODEL):
+            parts.append(delta)
+            yield delta
+    except Exception as e:
+        logging.debug(f"Error streaming from OpenAI API after {len(parts)} chunks: {e}")
+        raise StreamFailed(ERROR_REPLY) from e
+
+    record_turn(session_id, user_message, "".join(parts))
+
+
+def chat_stats():
+    """
+    Connection pool, write-behind, session cache, context window and model
+    gateway metrics for /api/chat/stats.
+    """
+    return {
+        "db_pool": db_pool.stats(),
+        "write_behind": conversation_writer.stats(),
+        "session_cache": session_history.stats(),
+        "context_window": context_window.stats(),
+        "llm": gateway.stats(),
+    }
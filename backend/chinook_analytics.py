@@ -0,0 +1,199 @@
+"""
+Pre-aggregated analytics tables derived from chinook.db.
+
+Most SQL Q&A questions (sales by country, top artists, revenue by genre,
+monthly totals) otherwise need a five-way join over invoices, invoice_items,
+tracks, albums and artists on every call. This module writes a separate
+SQLite file with one denormalized row per invoice line (sales_lines) and
+small summary tables built from it, so those questions become single-table
+lookups. sql_qa attaches the file to its read-only connections as
+"analytics" and lists its tables in the schema it sends the model.
+
+The file records the (mtime_ns, size) of the chinook.db it was built from
+and is rebuilt when that changes. Build it ahead of time (e.g. on deploy) with:
+
+    python chinook_analytics.py
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Tuple
+
+# Bump when the table definitions change so existing files are rebuilt
+BUILD_VERSION = 1
+
+_lock = threading.Lock()
+
+# (table, SELECT that fills it, indexed columns). Later tables may read earlier ones.
+TABLES = [
+    ("sales_lines", """
+        SELECT ii.InvoiceLineId, i.InvoiceId, CAST(i.InvoiceDate AS TEXT) AS InvoiceDate,
+               CAST(strftime('%Y', i.InvoiceDate) AS INTEGER) AS Year,
+               CAST(strftime('%m', i.InvoiceDate) AS INTEGER) AS Month,
+               c.CustomerId, CAST(c.FirstName || ' ' || c.LastName AS TEXT) AS CustomerName,
+               i.BillingCountry AS Country, i.BillingCity AS City, c.SupportRepId,
+               t.TrackId, t.Name AS TrackName, al.AlbumId, al.Title AS AlbumTitle,
+               ar.ArtistId, ar.Name AS ArtistName, g.Name AS GenreName, mt.Name AS MediaTypeName,
+               ii.UnitPrice, ii.Quantity, CAST(ii.UnitPrice * ii.Quantity AS REAL) AS LineTotal
+        FROM src.invoice_items ii
+        JOIN src.invoices i ON i.InvoiceId = ii.InvoiceId
+        JOIN src.customers c ON c.CustomerId = i.CustomerId
+        JOIN src.tracks t ON t.TrackId = ii.TrackId
+        JOIN src.albums al ON al.AlbumId = t.AlbumId
+        JOIN src.artists ar ON ar.ArtistId = al.ArtistId
+        LEFT JOIN src.genres g ON g.GenreId = t.GenreId
+        LEFT JOIN src.media_types mt ON mt.MediaTypeId = t.MediaTypeId
+    """, ["InvoiceId", "CustomerId", "Country", "TrackId", "ArtistId", "GenreName", "Year, Month"]),
+    ("sales_by_country", """
+        SELECT BillingCountry AS Country,
+               CAST(COUNT(*) AS INTEGER) AS Invoices,
+               CAST(COUNT(DISTINCT CustomerId) AS INTEGER) AS Customers,
+               CAST(ROUND(SUM(Total), 2) AS REAL) AS Revenue,
+               CAST(ROUND(AVG(Total), 2) AS REAL) AS AvgInvoice
+        FROM src.invoices GROUP BY BillingCountry
+    """, []),
+    ("sales_by_month", """
+        SELECT Year, Month,
+               CAST(COUNT(DISTINCT InvoiceId) AS INTEGER) AS Invoices,
+               CAST(SUM(Quantity) AS INTEGER) AS TracksSold,
+               CAST(ROUND(SUM(LineTotal), 2) AS REAL) AS Revenue
+        FROM sales_lines GROUP BY Year, Month
+    """, []),
+    ("sales_by_genre", """
+        SELECT GenreName,
+               CAST(SUM(Quantity) AS INTEGER) AS TracksSold,
+               CAST(COUNT(DISTINCT CustomerId) AS INTEGER) AS Customers,
+               CAST(ROUND(SUM(LineTotal), 2) AS REAL) AS Revenue
+        FROM sales_lines GROUP BY GenreName
+    """, []),
+    ("sales_by_artist", """
+        SELECT ArtistId, ArtistName,
+               CAST(SUM(Quantity) AS INTEGER) AS TracksSold,
+               CAST(COUNT(DISTINCT AlbumId) AS INTEGER) AS AlbumsSold,
+               CAST(COUNT(DISTINCT CustomerId) AS INTEGER) AS Customers,
+               CAST(ROUND(SUM(LineTotal), 2) AS REAL) AS Revenue
+        FROM sales_lines GROUP BY ArtistId
+    """, ["ArtistName"]),
+    ("sales_by_customer", """
+        SELECT c.CustomerId, CAST(c.FirstName || ' ' || c.LastName AS TEXT) AS CustomerName, c.Country, c.SupportRepId,
+               CAST(COUNT(i.InvoiceId) AS INTEGER) AS Invoices,
+               CAST(ROUND(COALESCE(SUM(i.Total), 0), 2) AS REAL) AS Revenue
+        FROM src.customers c LEFT JOIN src.invoices i ON i.CustomerId = c.CustomerId
+        GROUP BY c.CustomerId
+    """, ["Country"]),
+    ("sales_by_employee", """
+        SELECT e.EmployeeId, CAST(e.FirstName || ' ' || e.LastName AS TEXT) AS EmployeeName, e.Title,
+               CAST(COUNT(s.CustomerId) AS INTEGER) AS Customers,
+               CAST(COALESCE(SUM(s.Invoices), 0) AS INTEGER) AS Invoices,
+               CAST(ROUND(COALESCE(SUM(s.Revenue), 0), 2) AS REAL) AS Revenue
+        FROM src.employees e LEFT JOIN sales_by_customer s ON s.SupportRepId = e.EmployeeId
+        GROUP BY e.EmployeeId
+    """, []),
+    ("track_catalog", """
+        SELECT t.TrackId, t.Name AS TrackName, al.AlbumId, al.Title AS AlbumTitle,
+               ar.ArtistId, ar.Name AS ArtistName, g.Name AS GenreName, mt.Name AS MediaTypeName,
+               t.Composer, t.Milliseconds, t.UnitPrice,
+               CAST((SELECT COUNT(*) FROM src.playlist_track pt WHERE pt.TrackId = t.TrackId) AS INTEGER) AS Playlists,
+               CAST(COALESCE(s.TimesSold, 0) AS INTEGER) AS TimesSold,
+               CAST(COALESCE(s.Revenue, 0) AS REAL) AS Revenue
+        FROM src.tracks t
+        JOIN src.albums al ON al.AlbumId = t.AlbumId
+        JOIN src.artists ar ON ar.ArtistId = al.ArtistId
+        LEFT JOIN src.genres g ON g.GenreId = t.GenreId
+        LEFT JOIN src.media_types mt ON mt.MediaTypeId = t.MediaTypeId
+        LEFT JOIN (
+            SELECT TrackId, SUM(Quantity) AS TimesSold, ROUND(SUM(LineTotal), 2) AS Revenue
+            FROM sales_lines GROUP BY TrackId
+        ) s ON s.TrackId = t.TrackId
+    """, ["ArtistId", "AlbumId", "GenreName"]),
+]
+
+
+def default_path(source_path: str) -> str:
+    """
+    chinook.db -> chinook.analytics.db, next to the source.
+    """
+    return os.path.splitext(source_path)[0] + ".analytics.db"
+
+
+def source_signature(source_path: str) -> Tuple[int, int]:
+    st = os.stat(source_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def is_fresh(source_path: str, target_path: str) -> bool:
+    """
+    True if target_path was built by this BUILD_VERSION from the current source file.
+    """
+    if not os.path.exists(target_path):
+        return False
+    try:
+        conn = sqlite3.connect(f"file:{target_path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT source_mtime_ns, source_size, version FROM _build").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+    return row is not None and (row[0], row[1]) == source_signature(source_path) and row[2] == BUILD_VERSION
+
+
+def build_analytics(source_path: str, target_path: str) -> float:
+    """
+    Write the analytics tables for source_path to target_path, replacing it
+    atomically. Returns the build time in seconds.
+    """
+    started = time.perf_counter()
+    signature = source_signature(source_path)
+    tmp_path = f"{target_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path, uri=True)
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (f"file:{source_path}?mode=ro",))
+        for table, select, indexes in TABLES:
+            conn.execute(f"CREATE TABLE {table} AS {select}")
+            for columns in indexes:
+                name = f"idx_{table}_{columns.replace(', ', '_').lower()}"
+                conn.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+        conn.execute("CREATE TABLE _build (source_mtime_ns INTEGER, source_size INTEGER, version INTEGER, built_at REAL)")
+        conn.execute("INSERT INTO _build VALUES (?, ?, ?, ?)", (*signature, BUILD_VERSION, time.time()))
+        conn.commit()
+        conn.execute("DETACH DATABASE src")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, target_path)
+    return time.perf_counter() - started
+
+
+def ensure_analytics(source_path: str, target_path: str) -> bool:
+    """
+    Build target_path if it is missing or stale. Returns False (and logs why)
+    if it could not be built, e.g. because the directory is read-only.
+    """
+    with _lock:
+        if is_fresh(source_path, target_path):
+            return True
+        try:
+            seconds = build_analytics(source_path, target_path)
+        except (OSError, sqlite3.Error) as e:
+            logging.info(f"Could not build analytics tables {target_path}: {e}")
+            return False
+        logging.info(f"Built analytics tables {target_path} in {seconds:.2f}s")
+        return True
+
+
+if __name__ == "__main__":
+    # Same defaults as sql_qa
+    source = os.environ.get("CHINOOK_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "chinook.db"))
+    target = os.environ.get("SQL_QA_ANALYTICS_PATH") or default_path(source)
+
+    started = time.perf_counter()
+    if not ensure_analytics(source, target):
+        raise SystemExit(f"Could not build {target}")
+    print(f"{target}: {len(TABLES)} tables ready in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,146 @@
+"""
+Token-budgeted prompt assembly for the chatbot.
+
+The newest turns that fit in the budget are sent verbatim; older turns are
+folded into a rolling per-session summary that is sent as a second system
+message. Summaries are (re)built in a background green thread, so a turn
+never waits on one: until the summary catches up, turns that fell out of the
+window are simply left out.
+"""
+import logging
+
+import green
+from lru_cache import LRUCache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Per-message framing tokens in the chat format
+MESSAGE_OVERHEAD = 4
+
+
+class TokenCounter:
+    """
+    Counts tokens with tiktoken when it is installed, otherwise estimates
+    ~4 characters per token (close enough for budgeting English text).
+    """
+
+    def __init__(self, model: str):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+        self.name = self.encoding.name if self.encoding else "estimate"
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text or ""))
+        return (len(text or "") + 3) // 4
+
+    def message(self, message: dict) -> int:
+        return self.count(message["content"]) + MESSAGE_OVERHEAD
+
+
+class ContextWindow:
+    """
+    Args:
+        counter (TokenCounter): Token counter for the model in use.
+        budget (int): Prompt tokens allowed for system prompt, summary, history and new message.
+        summarize (callable): summarize(previous_summary, turns) -> str, called in the background.
+        max_sessions (int): Rolling summaries kept (LRU).
+    """
+
+    def __init__(self, counter, budget, summarize, max_sessions=1000):
+        self.counter = counter
+        self.budget = budget
+        self._summarize = summarize
+        self._summaries = LRUCache(max_sessions)  # session_id -> {"text", "through"}
+        self._in_progress = set()
+
+        self.builds = 0
+        self.turns_trimmed = 0
+        self.summaries_built = 0
+        self.summary_failures = 0
+        self.last_prompt_tokens = 0
+
+    @staticmethod
+    def summary_message(text: str) -> dict:
+        return {"role": "system", "content": f"Summary of the earlier conversation:\n{text}"}
+
+    def build(self, session_id, system_prompt: dict, turns, user_message: str):
+        """
+        Messages for the model: system prompt, rolling summary (if any), the
+        newest (user, bot) turns that fit the budget, then the new message.
+        """
+        user = {"role": "user", "content": user_message}
+        summary = self._summaries.get(session_id)
+        head = [system_prompt] + ([self.summary_message(summary["text"])] if summary else [])
+        remaining = self.budget - sum(self.counter.message(m) for m in [*head, user])
+
+        kept = 0
+        for user_message_, bot_reply in reversed(turns):
+            cost = self.counter.count(user_message_) + self.counter.count(bot_reply) + 2 * MESSAGE_OVERHEAD
+            if cost > remaining:
+                break
+            remaining -= cost
+            kept += 1
+
+        dropped, recent = list(turns[:len(turns) - kept]), list(turns[len(turns) - kept:])
+        if dropped:
+            self.turns_trimmed += len(dropped)
+            self._schedule_summary(session_id, summary, dropped, recent)
+
+        history = []
+        for user_message_, bot_reply in recent:
+            history.append({"role": "user", "content": user_message_})
+            history.append({"role": "assistant", "content": bot_reply})
+
+        self.builds += 1
+        self.last_prompt_tokens = self.budget - remaining
+        return [*head, *history, user]
+
+    def _schedule_summary(self, session_id, summary, dropped, recent):
+        """
+        Fold turns that left the window since the last summary into it.
+        """
+        through = summary["through"] if summary else None
+        if through is not None and through in recent:
+            return
+        if through is not None and through in dropped:
+            new_turns = dropped[len(dropped) - dropped[::-1].index(through):]
+        else:
+            new_turns = dropped
+        if not new_turns or session_id in self._in_progress:
+            return
+
+        self._in_progress.add(session_id)
+        green.spawn(self._update_summary, session_id, summary["text"] if summary else "", new_turns)
+
+    def _update_summary(self, session_id, previous, new_turns):
+        try:
+            text = self._summarize(previous, new_turns)
+            if text:
+                self._summaries.set(session_id, {"text": text, "through": tuple(new_turns[-1])})
+                self.summaries_built += 1
+        except Exception as e:
+            self.summary_failures += 1
+            logging.info(f"Error summarizing conversation for session {session_id}: {e}")
+        finally:
+            self._in_progress.discard(session_id)
+
+    def stats(self):
+        return {
+            "budget_tokens": self.budget,
+            "tokenizer": self.counter.name,
+            "builds": self.builds,
+            "last_prompt_tokens": self.last_prompt_tokens,
+            "turns_trimmed": self.turns_trimmed,
+            "summaries": len(self._summaries),
+            "summaries_built": self.summaries_built,
+            "summary_failures": self.summary_failures,
+            "summarizing": len(self._in_progress),
+        }
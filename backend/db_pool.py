@@ -0,0 +1,164 @@
+"""
+Bounded DB-API connection pool.
+
+Connections are opened lazily up to `max_size`, handed out one request at a
+time and returned idle for reuse, so a chat turn no longer pays a TCP + auth
+handshake per query. Waiting for a free slot uses green.Semaphore, so under
+eventlet a waiting request yields to other green threads instead of blocking
+the worker.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+import green
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool's wait timeout."""
+
+
+class ConnectionPool:
+    """
+    Args:
+        connect (callable): Opens a new DB-API connection.
+        max_size (int): Maximum open connections (idle + in use).
+        wait_timeout (float): Seconds to wait for a free connection before PoolTimeout.
+        health_check_after (float): Idle seconds after which a connection is
+            pinged with SELECT 1 before reuse.
+        max_idle (float): Idle seconds after which a connection is closed instead of reused.
+    """
+
+    def __init__(self, connect, max_size=5, wait_timeout=5.0, health_check_after=30.0, max_idle=600.0):
+        self._connect = connect
+        self.max_size = max_size
+        self.wait_timeout = wait_timeout
+        self.health_check_after = health_check_after
+        self.max_idle = max_idle
+
+        self._slots = green.Semaphore(max_size)
+        self._lock = green.Lock()
+        self._idle = []  # [(connection, returned_at)], most recently returned last
+        self._in_use = 0
+
+        self.created = 0
+        self.discarded = 0
+        self.health_check_failures = 0
+        self.acquired = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a `with` block. Any open
+        transaction is rolled back on return; broken connections are dropped.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            # Also runs on GeneratorExit when a streaming generator is closed early
+            self._release(conn)
+
+    def _acquire(self):
+        started = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            self.waits += 1
+            if not self._slots.acquire(timeout=self.wait_timeout):
+                self.timeouts += 1
+                raise PoolTimeout(f"No database connection free after {self.wait_timeout}s")
+        waited = time.monotonic() - started
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+        try:
+            conn = self._take_idle() or self._open()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+            self.acquired += 1
+        return conn
+
+    def _pop_idle(self):
+        with self._lock:
+            return self._idle.pop() if self._idle else (None, None)
+
+    def _take_idle(self):
+        while True:
+            conn, returned_at = self._pop_idle()
+            if conn is None:
+                return None
+            idle_for = time.monotonic() - returned_at
+            if getattr(conn, "closed", False) or idle_for > self.max_idle:
+                self._discard(conn)
+                continue
+            if idle_for > self.health_check_after and not self._healthy(conn):
+                self.health_check_failures += 1
+                self._discard(conn)
+                continue
+            return conn
+
+    def _open(self):
+        conn = self._connect()
+        self.created += 1
+        return conn
+
+    def _healthy(self, conn) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            conn.rollback()
+            return True
+        except Exception as e:
+            logging.info(f"Pooled connection failed health check: {e}")
+            return False
+
+    def _release(self, conn):
+        try:
+            if getattr(conn, "closed", False):
+                raise ConnectionError("connection closed")
+            conn.rollback()
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        except Exception:
+            self._discard(conn)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def _discard(self, conn):
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        while True:
+            conn, _ = self._pop_idle()
+            if conn is None:
+                return
+            self._discard(conn)
+
+    def stats(self):
+        return {
+            "max_size": self.max_size,
+            "open": len(self._idle) + self._in_use,
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "created": self.created,
+            "discarded": self.discarded,
+            "health_check_failures": self.health_check_failures,
+            "acquired": self.acquired,
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "wait_ms_avg": round(self.wait_seconds_total / self.acquired * 1000, 3) if self.acquired else 0.0,
+            "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+        }
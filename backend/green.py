@@ -0,0 +1,152 @@
+"""
+Concurrency primitives that cooperate with eventlet.
+
+app.py monkey-patches sockets when eventlet is installed, and gunicorn's
+eventlet worker patches threads as well, so request handlers run as green
+threads on one OS thread. Blocking on a plain threading primitive there would
+stall every green thread, so these helpers hand out eventlet primitives when
+sockets are patched and the standard threading ones otherwise (dev server,
+scripts).
+
+Code that is also entered from real OS threads (the Speech SDK's callback
+threads) must not use green primitives: a green thread started or woken from
+a foreign OS thread belongs to that thread's hub and never runs. The OS*
+helpers below always return the unpatched threading/queue objects, and
+call_in_hub() hands a call from any OS thread to a green thread on the main
+hub, e.g. to emit on a Socket.IO connection.
+"""
+import logging
+import queue
+import threading
+import time
+
+Empty = queue.Empty
+Full = queue.Full
+
+try:
+    import eventlet
+    import eventlet.greenthread
+    import eventlet.queue
+    import eventlet.semaphore
+    import eventlet.tpool
+    from eventlet import patcher
+except ImportError:
+    eventlet = None
+
+# threading/queue as they were before monkey-patching
+os_threading = patcher.original("threading") if eventlet is not None else threading
+os_queue = patcher.original("queue") if eventlet is not None else queue
+
+
+def is_green() -> bool:
+    return eventlet is not None and patcher.is_monkey_patched("socket")
+
+
+def Semaphore(value: int = 1):
+    return eventlet.semaphore.Semaphore(value) if is_green() else threading.Semaphore(value)
+
+
+def Lock():
+    return eventlet.semaphore.Semaphore(1) if is_green() else threading.Lock()
+
+
+def Queue(maxsize: int = 0):
+    return eventlet.queue.LightQueue(maxsize) if is_green() else queue.Queue(maxsize)
+
+
+def spawn(fn, *args, **kwargs):
+    """
+    Run `fn` in the background: a green thread under eventlet, else a daemon thread.
+    """
+    if is_green():
+        return eventlet.spawn(fn, *args, **kwargs)
+    thread = threading.Thread(target=fn, args=args, kwargs=kwargs, daemon=True)
+    thread.start()
+    return thread
+
+
+def cancel(worker):
+    """
+    Stop a worker started by spawn(). A green thread is killed where it is
+    blocked; an OS thread can't be interrupted and is left to finish.
+    """
+    if eventlet is not None and isinstance(worker, eventlet.greenthread.GreenThread):
+        worker.kill()
+
+
+def sleep(seconds: float):
+    if is_green():
+        eventlet.sleep(seconds)
+    else:
+        time.sleep(seconds)
+
+
+
+def OSLock():
+    """
+    A lock that works between OS threads whether or not threading is patched.
+    Never hold it across a call that may yield to the hub.
+    """
+    return os_threading.Lock()
+
+
+def OSQueue(maxsize: int = 0):
+    return os_queue.Queue(maxsize)
+
+
+def os_local():
+    return os_threading.local()
+
+
+def start_os_thread(fn, *args, name=None):
+    """
+    Run `fn` on a new daemon OS thread, never a green one.
+    """
+    thread = os_threading.Thread(target=fn, args=args, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+_hub_calls = os_queue.Queue()
+_hub_ident = None
+_hub_lock = os_threading.Lock()
+
+
+def _run_hub_calls():
+    while True:
+        # The blocking get runs on an eventlet tpool thread, which wakes this hub
+        # thread-safely. The timeout lets tpool's threads be joined at exit.
+        try:
+            fn, args, kwargs = eventlet.tpool.execute(_hub_calls.get, True, 1.0)
+        except os_queue.Empty:
+            continue
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            logging.info(f"Hub call {getattr(fn, '__name__', fn)} failed: {e}")
+
+
+def start_hub_dispatcher() -> None:
+    """
+    Start the green thread that runs call_in_hub() calls, on the calling
+    thread's hub. Call it once from the main thread; later calls do nothing.
+    """
+    global _hub_ident
+    if not is_green():
+        return
+    with _hub_lock:
+        if _hub_ident is None:
+            _hub_ident = os_threading.get_ident()
+            eventlet.spawn(_run_hub_calls)
+
+
+def call_in_hub(fn, *args, **kwargs) -> None:
+    """
+    Run fn(*args, **kwargs) on the main hub. From the hub's own thread, or
+    without eventlet or a started dispatcher, it runs at once; from any other
+    OS thread it is queued and this returns without waiting.
+    """
+    if _hub_ident is None or os_threading.get_ident() == _hub_ident:
+        fn(*args, **kwargs)
+    else:
+        _hub_calls.put((fn, args, kwargs))
@@ -0,0 +1,185 @@
+"""
+Shared gateway for OpenAI chat completions.
+
+chatbot.py and sql_qa.py both call the model through the one `gateway`
+instance here, so they share a single OpenAI client and its keep-alive HTTP
+connection pool. A global semaphore caps completions in flight. Each call
+gets a timeout, and transient failures (connection errors, timeouts, 429s,
+5xx) are retried with full-jitter exponential backoff. app.py monkey-patches
+sockets, so under eventlet a call in flight parks only its own green thread,
+and green.Semaphore makes the callers waiting on the cap yield as well.
+"""
+import logging
+import os
+import random
+import time
+from collections import deque
+
+from openai import (
+    APIConnectionError,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+
+import green
+
+# Exceptions worth another attempt (APITimeoutError is an APIConnectionError)
+RETRYABLE = (APIConnectionError, RateLimitError, InternalServerError)
+
+
+class LLMBusy(Exception):
+    """No completion slot became free within the gateway's queue timeout."""
+
+
+class LLMGateway:
+    """
+    Args:
+        client (OpenAI): Client to share; its HTTP connections are kept alive and reused.
+        max_concurrency (int): Completions in flight at once across the process.
+        queue_timeout (float): Seconds to wait for a free slot before LLMBusy.
+        timeout (float): Default per-attempt request timeout in seconds.
+        max_retries (int): Extra attempts for transient failures.
+        backoff_base (float): First retry waits up to this many seconds; doubles per retry.
+        backoff_max (float): Cap on a single backoff.
+    """
+
+    def __init__(self, client, max_concurrency=16, queue_timeout=10.0, timeout=30.0,
+                 max_retries=2, backoff_base=0.5, backoff_max=8.0):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._slots = green.Semaphore(max_concurrency)
+        self._latencies = deque(maxlen=1000)  # seconds, successful calls only
+
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.rejected = 0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def api_key(self):
+        return self.client.api_key
+
+    def _acquire(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self.rejected += 1
+            raise LLMBusy(f"No model slot free after {self.queue_timeout}s")
+        self.wait_seconds_max = max(self.wait_seconds_max, time.monotonic() - started)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _create(self, timeout, kwargs):
+        """
+        Create a completion, retrying transient failures. Caller holds a slot.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self.client.chat.completions.create(timeout=timeout or self.timeout, **kwargs)
+            except RETRYABLE as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                self.retries += 1
+                logging.info(f"Model call failed ({type(e).__name__}); retry {attempt} in {delay:.2f}s")
+                green.sleep(delay)
+
+    def complete(self, messages, model, timeout=None, **kwargs):
+        """
+        Chat completion through the gateway.
+
+        Args:
+            messages (list): Chat messages.
+            model (str): Model name.
+            timeout (float): Per-attempt timeout; defaults to the gateway's.
+
+        Returns:
+            ChatCompletion: The completion object from the OpenAI client.
+        """
+        self._acquire()
+        self.calls += 1
+        started = time.monotonic()
+        try:
+            completion = self._create(timeout, dict(model=model, messages=messages, **kwargs))
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._release()
+        self._latencies.append(time.monotonic() - started)
+        return completion
+
+    def stream(self, messages, model, timeout=None, **kwargs):
+        """
+        Streamed chat completion. Yields text deltas; the slot is held until
+        the stream ends. Only opening the stream is retried; once text has
+        been yielded, a failure is raised to the caller.
+        """
+        self._acquire()
+        self.calls += 1
+        started = time.monotonic()
+        try:
+            with self._create(timeout, dict(model=model, messages=messages, stream=True, **kwargs)) as chunks:
+                for chunk in chunks:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        yield delta
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._release()
+        self._latencies.append(time.monotonic() - started)
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else 0.0
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "queue_wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+            "latency_ms_p50": percentile(0.50),
+            "latency_ms_p95": percentile(0.95),
+            "latency_ms_p99": percentile(0.99),
+        }
+
+
+# Retries are handled by the gateway, so the client's own are turned off.
+# OPENAI_BASE_URL points both chatbot and sql_qa at another server (e.g. mock_llm.py).
+gateway = LLMGateway(
+    OpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY", ""),
+        base_url=os.environ.get("OPENAI_BASE_URL") or None,
+        max_retries=0,
+    ),
+    max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "16")),
+    queue_timeout=float(os.environ.get("LLM_QUEUE_TIMEOUT", "10")),
+    timeout=float(os.environ.get("LLM_TIMEOUT", "30")),
+    max_retries=int(os.environ.get("LLM_MAX_RETRIES", "2")),
+)
@@ -0,0 +1,161 @@
+"""
+Load generator for the chat, generate and SQL Q&A endpoints.
+
+Runs closed-loop workers against a running backend and reports throughput,
+error counts and p50/p95/p99 latency per endpoint (plus time to first chunk
+with --stream). Point the backend at mock_llm.py so runs are repeatable and
+cost nothing:
+
+    python mock_llm.py --latency-ms 800 &
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock python app.py &
+    python load_test.py --url http://127.0.0.1:5001 --concurrency 32 --duration 30 --json load.json
+
+`python app.py` listens on 5001; --url defaults to 5000, where Gunicorn serves it in production.
+"""
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+QUESTIONS = [
+    "Which artists have the most albums?",
+    "What are the top 5 genres by number of tracks?",
+    "Which customers spent the most in total?",
+    "How many invoices were issued per country?",
+]
+MESSAGES = [
+    "Hi, my name is Sam and I like jazz.",
+    "Can you recommend an album for a rainy afternoon?",
+    "What did I say my name was?",
+    "Summarize what we've talked about so far.",
+]
+
+
+def make_request(endpoint: str, i: int, sessions: int, stream: bool) -> tuple:
+    """
+    (path, JSON body) for the i-th request to an endpoint.
+    """
+    session_id = f"load-{endpoint}-{i % sessions}"
+    if endpoint == "chat":
+        return "/api/chat", {"session_id": session_id, "message": MESSAGES[i % len(MESSAGES)], "stream": stream}
+    if endpoint == "generate":
+        return "/api/generate", {"session_id": session_id, "prompt": MESSAGES[i % len(MESSAGES)], "stream": stream}
+    if endpoint == "sql_qa":
+        return "/api/sql_qa", {"session_id": session_id, "question": QUESTIONS[i % len(QUESTIONS)]}
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+def send(http, base_url, headers, endpoint, i, sessions, stream, timeout) -> dict:
+    path, body = make_request(endpoint, i, sessions, stream)
+    started = time.perf_counter()
+    first_chunk = None
+    tail = b""
+    try:
+        with http.post(base_url + path, json=body, headers=headers, timeout=timeout, stream=stream) as response:
+            if stream:
+                for chunk in response.iter_content(chunk_size=None):
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter() - started
+                    tail = (tail + chunk)[-4096:]
+            else:
+                response.content
+            # A stream that fails midway still returns 200; its last event is {"error": ...}
+            ok = response.status_code < 400 and b'"error"' not in tail.rsplit(b"data: ", 1)[-1]
+    except requests.RequestException:
+        ok = False
+    return {"endpoint": endpoint, "ok": ok, "seconds": time.perf_counter() - started, "first_chunk": first_chunk}
+
+
+def summarize(samples, elapsed: float) -> dict:
+    ms = np.array([s["seconds"] for s in samples if s["ok"]]) * 1000
+    first = np.array([s["first_chunk"] for s in samples if s["ok"] and s["first_chunk"] is not None]) * 1000
+
+    def pct(values, p):
+        return round(float(np.percentile(values, p)), 1) if len(values) else 0.0
+
+    result = {
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if not s["ok"]),
+        "requests_per_second": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms_p50": pct(ms, 50),
+        "latency_ms_p95": pct(ms, 95),
+        "latency_ms_p99": pct(ms, 99),
+        "latency_ms_max": round(float(ms.max()), 1) if len(ms) else 0.0,
+    }
+    if len(first):
+        result["first_chunk_ms_p50"] = pct(first, 50)
+        result["first_chunk_ms_p95"] = pct(first, 95)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat and SQL Q&A endpoints.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="backend base URL (python app.py listens on 5001)")
+    parser.add_argument("--api-key", default=os.environ.get("FLASK_API_KEY", ""), help="defaults to FLASK_API_KEY")
+    parser.add_argument("--endpoints", default="chat,generate,sql_qa", help="comma-separated: chat, generate, sql_qa")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent workers")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many requests (0 = use --duration)")
+    parser.add_argument("--sessions", type=int, default=50, help="distinct session ids per endpoint")
+    parser.add_argument("--stream", action="store_true", help="use the SSE mode of chat and generate")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    headers = {"Authorization": f"Bearer {args.api_key}"} if args.api_key else {}
+    base_url = args.url.rstrip("/")
+
+    counter = itertools.count()
+    counter_lock = threading.Lock()
+    samples = []
+    deadline = time.perf_counter() + args.duration
+
+    def worker():
+        http = requests.Session()  # one keep-alive connection per worker
+        while True:
+            with counter_lock:
+                i = next(counter)
+            if (args.requests and i >= args.requests) or (not args.requests and time.perf_counter() >= deadline):
+                return
+            samples.append(send(
+                http, base_url, headers, endpoints[i % len(endpoints)], i // len(endpoints),
+                args.sessions, args.stream, args.timeout,
+            ))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for _ in range(args.concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - started
+
+    results = {
+        "url": base_url,
+        "concurrency": args.concurrency,
+        "stream": args.stream,
+        "elapsed_s": round(elapsed, 2),
+        "total": summarize(samples, elapsed),
+        "endpoints": {
+            endpoint: summarize([s for s in samples if s["endpoint"] == endpoint], elapsed)
+            for endpoint in endpoints
+        },
+    }
+
+    for name, stats in [("total", results["total"]), *results["endpoints"].items()]:
+        print(f"{name}:")
+        for key, value in stats.items():
+            print(f"{key:>22}: {value}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Local stand-in for the OpenAI chat completions API, for load testing.
+
+Answers POST /v1/chat/completions (plain and streamed) after a simulated
+delay drawn from a log-normal distribution. Replies come from rules that
+match a regex against the request's messages. The built-in rules return
+valid {sql, answer} JSON for sql_qa, a short summary for the chatbot's
+context window, and a canned reply otherwise. A --script JSON file of
+{"pattern", "reply"} rules is checked first.
+
+    python mock_llm.py --port 8001 --latency-ms 800 --sigma 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock python app.py
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+
+from flask import Flask, Response, jsonify, request
+
+DEFAULT_RULES = [
+    {
+        "pattern": r"Chinook SQLite database",
+        "reply": json.dumps({
+            "sql": "SELECT Name FROM artists ORDER BY Name LIMIT 10",
+            "answer": "Here are the first ten artists by name.",
+        }),
+    },
+    {
+        "pattern": r"running summary of a conversation",
+        "reply": "The user has been chatting with the assistant; no new facts to remember.",
+    },
+    {
+        "pattern": r"",
+        "reply": "This is a mock reply from the local load-testing server. It stands in for the model so latency stays predictable.",
+    },
+]
+
+app = Flask(__name__)
+config = {
+    "latency_ms": 800.0,
+    "sigma": 0.5,
+    "chunk_ms": 20.0,
+    "error_rate": 0.0,
+    "rules": DEFAULT_RULES,
+}
+counters = {"requests": 0, "streams": 0, "errors": 0}
+counters_lock = threading.Lock()
+
+
+def sample_latency() -> float:
+    """
+    Seconds to wait before answering: log-normal with median `latency_ms`.
+    """
+    if config["latency_ms"] <= 0:
+        return 0.0
+    return random.lognormvariate(math.log(config["latency_ms"] / 1000), config["sigma"])
+
+
+def pick_reply(messages) -> str:
+    text = "\n".join(str(m.get("content") or "") for m in messages)
+    for rule in config["rules"]:
+        if re.search(rule["pattern"], text):
+            return rule["reply"]
+    return ""
+
+
+def count_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def completion_body(model, reply, prompt_tokens):
+    return {
+        "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": reply},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": count_tokens(reply),
+            "total_tokens": prompt_tokens + count_tokens(reply),
+        },
+    }
+
+
+def stream_chunks(model, reply):
+    """
+    SSE chunks in the OpenAI streaming format, one word per chunk.
+    """
+    completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+    words = re.findall(r"\S+\s*", reply) or [""]
+    for i, word in enumerate(words):
+        delta = {"role": "assistant", "content": word} if i == 0 else {"content": word}
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        if config["chunk_ms"] > 0:
+            time.sleep(config["chunk_ms"] / 1000)
+    done = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+    }
+    yield f"data: {json.dumps(done)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+def chat_completions():
+    data = request.get_json(silent=True) or {}
+    messages = data.get("messages") or []
+    model = data.get("model") or "mock"
+
+    with counters_lock:
+        counters["requests"] += 1
+    time.sleep(sample_latency())
+
+    if random.random() < config["error_rate"]:
+        with counters_lock:
+            counters["errors"] += 1
+        return jsonify({"error": {"message": "Mock server error", "type": "server_error"}}), 500
+
+    reply = pick_reply(messages)
+    if data.get("stream"):
+        with counters_lock:
+            counters["streams"] += 1
+        return Response(stream_chunks(model, reply), mimetype="text/event-stream")
+
+    prompt_tokens = sum(count_tokens(str(m.get("content") or "")) for m in messages)
+    return jsonify(completion_body(model, reply, prompt_tokens))
+
+
+@app.get("/v1/models")
+def models():
+    return jsonify({"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]})
+
+
+@app.get("/stats")
+def stats():
+    with counters_lock:
+        return jsonify({**counters, "latency_ms": config["latency_ms"], "sigma": config["sigma"]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible server for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="median delay before a reply (0 = none)")
+    parser.add_argument("--sigma", type=float, default=0.5, help="log-normal spread of the delay")
+    parser.add_argument("--chunk-ms", type=float, default=20.0, help="delay between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--script", help='JSON file of [{"pattern": regex, "reply": text}] rules, checked first')
+    parser.add_argument("--seed", type=int, help="seed the latency and error sampling")
+    args = parser.parse_args()
+
+    config.update(
+        latency_ms=args.latency_ms,
+        sigma=args.sigma,
+        chunk_ms=args.chunk_ms,
+        error_rate=args.error_rate,
+    )
+    if args.script:
+        with open(args.script, "r") as f:
+            config["rules"] = json.load(f) + DEFAULT_RULES
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
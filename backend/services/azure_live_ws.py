@@ -1,13 +1,23 @@
-import os, requests
+import os
 from flask import request
 from flask_socketio import Namespace
 from dotenv import load_dotenv
+import green
+from translator import translator
+from caption_pipeline import CaptionPipeline
+from audio_ingest import AudioIngest
 import azure.cognitiveservices.speech as speechsdk
 from azure.cognitiveservices.speech.audio import PushAudioInputStream, AudioConfig, AudioStreamFormat
 from azure.cognitiveservices.speech.languageconfig import AutoDetectSourceLanguageConfig
 
 load_dotenv()
 
+# Translations in flight per session before new finals are left untranslated
+MAX_PENDING_TRANSLATIONS = int(os.getenv("AZURE_LIVE_MAX_PENDING_TRANSLATIONS", "8"))
+# Incoming audio is written to the recognizer in blocks of this many ms, holding at most AUDIO_MAX_BUFFER_MS
+AUDIO_FLUSH_MS = int(os.getenv("AZURE_LIVE_FLUSH_MS", "100"))
+AUDIO_MAX_BUFFER_MS = int(os.getenv("AZURE_LIVE_MAX_BUFFER_MS", "2000"))
+
 def _to_bcp47(lang: str) -> str:
     if not lang: return "en-US"
     if "-" in lang: return lang
@@ -20,32 +30,6 @@ def _to_bcp47(lang: str) -> str:
 def _short(lang: str) -> str:
     return (lang or "en").split("-")[0]
 
-def _translate(text: str, src_short: str, tgt_short: str) -> str:
-    if not text: return ""
-    ep  = (os.getenv("AZURE_TRANSLATOR_ENDPOINT") or "").rstrip("/")
-    key = os.getenv("AZURE_TRANSLATOR_KEY")
-    reg = os.getenv("AZURE_TRANSLATOR_REGION")  # optional depending on your resource
-    if not ep or not key: return ""
-    try:
-        r = requests.post(
-            f"{ep}/translate",
-            params={"api-version":"3.0","to":tgt_short, "from":src_short},
-            headers={
-                "Ocp-Apim-Subscription-Key": key,
-                "Content-Type": "application/json",
-                **({"Ocp-Apim-Subscription-Region": reg} if reg else {})
-            },
-            json=[{"Text": text}],
-            timeout=10
-        )
-        r.raise_for_status()
-        data = r.json()
-        trs = data[0].get("translations") if isinstance(data, list) and data else None
-        return (trs[0].get("text") if trs else "") or ""
-    except Exception as e:
-        print(f"[azure-live] translate error: {e}")
-        return ""
-
 def _detected_bcp47_from(evt):
     try:
         res = speechsdk.AutoDetectSourceLanguageResult.from_result(evt.result)
@@ -60,6 +44,10 @@ class AzureLiveNamespace(Namespace):
         self._recs    = {}  # sid -> SpeechRecognizer
         self._langs   = {}  # sid -> (src_short, tgt_short)
         self._auto    = {}  # sid -> bool
+        self._captions = {}  # sid -> CaptionPipeline
+        self._ingest  = {}  # sid -> AudioIngest
+        # SDK and translator threads hand caption emits to the main hub through this
+        green.start_hub_dispatcher()
 
     def on_connect(self, auth):
         sid = request.sid
@@ -118,10 +106,14 @@ class AzureLiveNamespace(Namespace):
         self._build_and_start_recognizer(sid, src_bcp47, auto_flag=auto_flag)
         self.emit("started", {"ok": True}, room=sid)
 
+    def on_get_stats(self, data=None):
+        # Returned to the client as the event's ack
+        return self.session_stats(request.sid)
+
     def on_audio_chunk(self, data):
         sid = request.sid
-        stream = self._streams.get(sid)
-        if not stream:
+        ingest = self._ingest.get(sid)
+        if not ingest or not self._streams.get(sid):
             # print(f"[azure-live] warning: no stream for {sid}")
             return
 
@@ -137,23 +129,12 @@ class AzureLiveNamespace(Namespace):
         else:
             chunk = data
 
-        b = chunk if isinstance(chunk, (bytes, bytearray)) else bytes(chunk or b"")
-        if not b:
+        if not chunk:
             return
-        
-        if len(b) > 0:
-             # DEBUG: Print EVERY chunk to confirm data arrival
-              try:
-                  # Show first 5 samples (10 bytes) in hex to see if it's all zeros or FFs
-                  hex_preview = b[:10].hex()
-                  print(f"[azure-live] audio_chunk {sid} len={len(b)} hex={hex_preview}", flush=True) 
-              except Exception as e:
-                 print(f"[azure-live] audio_chunk {sid} len={len(b)} log_err={e}", flush=True) 
-        
-        try:
-            stream.write(b)
-        except Exception as e:
-            print(f"[azure-live] write error {sid}: {e}")
+        if not isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = bytes(chunk)
+        # Buffered without copying to a new bytes object; written in AUDIO_FLUSH_MS blocks
+        ingest.feed(chunk)
 
     def on_end_of_stream(self):
         sid = request.sid
@@ -161,36 +142,68 @@ class AzureLiveNamespace(Namespace):
         self._stop_session(sid, remove=False)
         self.emit("stopped", {"ok": True}, room=sid)
 
+    def session_stats(self, sid):
+        ingest = self._ingest.get(sid)
+        captions = self._captions.get(sid)
+        return {
+            "audio": ingest.stats() if ingest else None,
+            "captions": captions.stats() if captions else None,
+        }
+
+    def stats(self):
+        """
+        Per-sid audio and caption counters plus the shared translator's, for /api/azure_live/stats.
+        """
+        sids = set(self._ingest) | set(self._captions)
+        return {
+            "sessions": {sid: self.session_stats(sid) for sid in sids},
+            "translator": translator.stats(),
+        }
+
     # ----- internals -----
 
+    def _caption_pipeline(self, sid):
+        # One per sid, kept across recognizer restarts so seq keeps counting up
+        captions = self._captions.get(sid)
+        if captions is None:
+            captions = self._captions[sid] = CaptionPipeline(
+                lambda event, payload: self.emit(event, payload, room=sid),
+                translator.submit,
+                max_pending=MAX_PENDING_TRANSLATIONS,
+                dispatch=green.call_in_hub,
+            )
+        return captions
+
     def _attach_handlers(self, rec, sid):
+        # Callbacks run on the SDK's event thread: they only queue work on the
+        # caption pipeline, which emits in order on the main hub and translates
+        # in the background
+        captions = self._caption_pipeline(sid)
+
         def _maybe_emit_detected(evt):
             detected = _detected_bcp47_from(evt)
             if detected:
-                self.emit("lang_detected", {"detected": detected}, room=sid)
+                captions.send("lang_detected", {"detected": detected})
                 expected_short = self._langs.get(sid, ("en","es"))[0]
                 if _short(detected) and expected_short and _short(detected) != expected_short:
-                    self.emit("lang_warning", {"detected": _short(detected)}, room=sid)
+                    captions.send("lang_warning", {"detected": _short(detected)})
 
         def _on_partial(evt):
             print(f"[azure-live] partial from Azure: {evt.result.text}")
             _maybe_emit_detected(evt)
             txt = evt.result.text or ""
-            self.emit("partial_result", {"text": txt}, room=sid)
+            captions.partial(txt)
 
         def _on_final(evt):
             print(f"[azure-live] FINAL from Azure: {evt.result.text}")
             _maybe_emit_detected(evt)
             txt = evt.result.text or ""
             print(f"[azure-live] EMITTING final_result to {sid}: {txt}", flush=True)
-            self.emit("final_result", {"text": txt}, room=sid)
 
             detected = _detected_bcp47_from(evt)
             src_eff = _short(detected) if detected else self._langs.get(sid, ("en","es"))[0]
             tgt_eff = self._langs.get(sid, ("en","es"))[1]
-            tx = _translate(txt, src_eff, tgt_eff)
-            if tx:
-                self.emit("final_translation", {"translation": tx}, room=sid)
+            captions.final(txt, src_eff, tgt_eff)
 
         rec.recognizing.connect(_on_partial)
         rec.recognized.connect(_on_final)
@@ -237,6 +250,12 @@ class AzureLiveNamespace(Namespace):
         self._attach_handlers(rec, sid)
         self._streams[sid] = stream
         self._recs[sid] = rec
+        ingest = self._ingest.get(sid)
+        if ingest is None:
+            ingest = self._ingest[sid] = AudioIngest(
+                sample_rate=16000, sample_bytes=2, flush_ms=AUDIO_FLUSH_MS, max_buffer_ms=AUDIO_MAX_BUFFER_MS,
+            )
+        ingest.attach(stream)
 
         print(f"[azure-live] starting continuous recognition async...")
         # CRITICAL FIX: Do NOT call .get() here. It blocks the eventlet green thread
@@ -247,6 +266,8 @@ class AzureLiveNamespace(Namespace):
     def _stop_session(self, sid, remove=False):
         stream = self._streams.get(sid)
         rec = self._recs.get(sid)
+        ingest = self._ingest.get(sid)
+        if ingest: ingest.detach()  # write the buffered tail before closing
         try:
             if stream: stream.close()
         except Exception:
@@ -261,3 +282,5 @@ class AzureLiveNamespace(Namespace):
             self._recs.pop(sid, None)
             self._langs.pop(sid, None)
             self._auto.pop(sid, None)
+            self._captions.pop(sid, None)
+            self._ingest.pop(sid, None)
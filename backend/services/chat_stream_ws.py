@@ -0,0 +1,45 @@
+import os
+from flask import request
+from flask_socketio import Namespace
+
+class ChatStreamNamespace(Namespace):
+    """
+    Socket.IO counterpart of POST /api/chat with streaming.
+
+    Client emits "message" {session_id, message}; server replies with a
+    "token" {delta} event per chunk and a final "done" {reply, session_id},
+    or "error" {error, session_id} if the reply could not be completed.
+    If FLASK_API_KEY is set, connect with auth {"token": <key>}.
+    """
+
+    def on_connect(self, auth):
+        api_key = os.environ.get("FLASK_API_KEY")
+        token = auth.get("token") if isinstance(auth, dict) else None
+        if api_key and token != api_key:
+            print(f"[chat-stream] rejected {request.sid}: bad or missing token")
+            return False
+
+    def on_message(self, data):
+        sid = request.sid
+        data = data if isinstance(data, dict) else {}
+        session_id = data.get("session_id")
+        user_message = (data.get("message") or "").strip()
+
+        if not session_id:
+            self.emit("error", {"error": "Session ID is required."}, room=sid)
+            return
+        if not user_message:
+            self.emit("error", {"error": "Message cannot be empty."}, room=sid)
+            return
+
+        from chatbot import stream_message, StreamFailed  # lazy import, as in app.py
+
+        parts = []
+        try:
+            for delta in stream_message(user_message, session_id):
+                parts.append(delta)
+                self.emit("token", {"delta": delta}, room=sid)
+        except StreamFailed as e:
+            self.emit("error", {"error": str(e), "session_id": session_id}, room=sid)
+            return
+        self.emit("done", {"reply": "".join(parts), "session_id": session_id}, room=sid)
@@ -0,0 +1,111 @@
+"""
+In-process cache of recent chat turns per session.
+
+Each cached session is a ring buffer of its last `max_turns` (user, bot)
+pairs. A session is only cached once its history has been loaded from the
+database, after which new turns are appended here as they happen, so the
+cache stays a faithful copy and the next turn skips the SELECT. Sessions are
+evicted least-recently-used when either the session count or the total text
+size goes over its limit.
+"""
+from collections import OrderedDict, deque
+
+import green
+
+
+class SessionHistoryCache:
+    """
+    Args:
+        max_turns (int): Turns kept per session (the history window sent to the model).
+        max_sessions (int): Sessions kept before the least recently used is evicted.
+        max_bytes (int): Total UTF-8 size of cached messages across all sessions.
+    """
+
+    def __init__(self, max_turns=20, max_sessions=1000, max_bytes=8 * 2 ** 20):
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+
+        self._sessions = OrderedDict()  # session_id -> deque[(user, bot, size)]
+        self._sizes = {}  # session_id -> bytes held
+        self._bytes = 0
+        self._lock = green.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(user_message, bot_reply):
+        return len(user_message.encode("utf-8")) + len(bot_reply.encode("utf-8"))
+
+    def get(self, session_id):
+        """
+        Cached turns as [(user, bot), ...] oldest first, or None on a miss.
+        """
+        with self._lock:
+            turns = self._sessions.get(session_id)
+            if turns is None:
+                self.misses += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+            return [(user, bot) for user, bot, _ in turns]
+
+    def load(self, session_id, turns):
+        """
+        Cache a session's complete recent history as read from the database.
+        """
+        with self._lock:
+            self._drop(session_id)
+            buffer = deque(maxlen=self.max_turns)
+            self._sessions[session_id] = buffer
+            self._sizes[session_id] = 0
+            for user_message, bot_reply in turns:
+                self._push(session_id, buffer, user_message, bot_reply)
+            self._evict()
+
+    def append(self, session_id, user_message, bot_reply):
+        """
+        Record a new turn for a cached session. Uncached sessions are left
+        alone; their next read loads the full history from the database.
+        """
+        with self._lock:
+            buffer = self._sessions.get(session_id)
+            if buffer is None:
+                return
+            self._sessions.move_to_end(session_id)
+            self._push(session_id, buffer, user_message, bot_reply)
+            self._evict()
+
+    def _push(self, session_id, buffer, user_message, bot_reply):
+        if len(buffer) == buffer.maxlen:
+            self._sizes[session_id] -= buffer[0][2]
+            self._bytes -= buffer[0][2]
+        size = self._size(user_message, bot_reply)
+        buffer.append((user_message, bot_reply, size))
+        self._sizes[session_id] += size
+        self._bytes += size
+
+    def _drop(self, session_id):
+        if self._sessions.pop(session_id, None) is not None:
+            self._bytes -= self._sizes.pop(session_id)
+
+    def _evict(self):
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            oldest = next(iter(self._sessions))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,266 @@
+"""
+Offline index advisor for SQL Q&A.
+
+Reads the query log sql_qa writes (SQL_QA_QUERY_LOG), replays every distinct
+query against an in-memory copy of chinook.db and counts the SQLite VM steps
+it takes. Only statements that pass sql_qa's SELECT-only check are replayed,
+with PRAGMA query_only on, so a tampered log can't write through the advisor. Candidate indexes come from the tables each plan scans and the
+columns the query mentions: one per column, plus one covering index per
+table. Candidates are tried one at a time and the best is kept, repeating
+until none improves things by at least --min-gain. A candidate is scored by
+the average fractional saving per query, weighted by how often each query was
+logged, so one huge query can't hide improvements to the rest.
+
+    python sql_index_advisor.py --log sql_qa_queries.jsonl
+    python sql_index_advisor.py --log sql_qa_queries.jsonl --output chinook.optimized.db
+
+--output writes a copy of the database with the chosen indexes and fresh
+ANALYZE statistics. Point CHINOOK_DB_PATH at it to serve SQL Q&A from it.
+
+The analytics tables (chinook_analytics.py) are attached read-only as
+"analytics", as sql_qa does, so queries against them are replayed and
+counted too; indexes are only proposed for chinook.db's own tables. Queries
+that still fail to replay are left out and reported.
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+from collections import Counter
+
+import chinook_analytics
+import sql_plan
+
+DEFAULT_DB = os.environ.get("CHINOOK_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "chinook.db"))
+DEFAULT_ANALYTICS = os.environ.get("SQL_QA_ANALYTICS_PATH", chinook_analytics.default_path(DEFAULT_DB))
+DEFAULT_LOG = os.environ.get(
+    "SQL_QA_QUERY_LOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql_qa_queries.jsonl")
+)
+
+
+def load_queries(path: str, rejected=None) -> Counter:
+    """
+    Distinct SQL from the query log with the number of times each appeared.
+    Statements that fail the SELECT-only check are left out and appended to
+    `rejected` if given.
+    """
+    queries = Counter()
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                sql = json.loads(line).get("sql", "").strip()
+            except (ValueError, AttributeError):
+                continue
+            if not sql:
+                continue
+            if sql_plan.is_select_only(sql):
+                queries[sql] += 1
+            elif rejected is not None and sql not in rejected:
+                rejected.append(sql)
+    return queries
+
+
+def vm_steps(conn: sqlite3.Connection, sql: str, max_steps: int):
+    """
+    VM steps to run `sql` to completion, capped at max_steps; None if it fails.
+    """
+    steps = [0]
+
+    def progress():
+        steps[0] += 100
+        return 1 if steps[0] >= max_steps else 0
+
+    conn.set_progress_handler(progress, 100)
+    try:
+        conn.execute(sql).fetchall()
+    except sqlite3.OperationalError:
+        # Interrupted at the cap counts as max_steps; anything else is a broken query
+        if steps[0] < max_steps:
+            return None
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.set_progress_handler(None, 100)
+    return min(steps[0], max_steps)
+
+
+def table_columns(conn: sqlite3.Connection):
+    """
+    {table: [(column, is_integer_primary_key), ...]} keyed by lower-cased table name.
+    """
+    columns = {}
+    for (table,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall():
+        info = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+        # info: cid, name, type, notnull, dflt_value, pk
+        columns[table.lower()] = [(c[1], c[5] == 1 and "INT" in (c[2] or "").upper()) for c in info]
+    return columns
+
+
+def existing_indexes(conn: sqlite3.Connection):
+    """
+    Set of (table, (columns...)) already indexed.
+    """
+    indexed = set()
+    for name, table in conn.execute(
+        "SELECT name, tbl_name FROM sqlite_master WHERE type='index'"
+    ).fetchall():
+        cols = tuple(r[2].lower() for r in conn.execute(f'PRAGMA index_info("{name}")').fetchall() if r[2])
+        indexed.add((table.lower(), cols))
+    return indexed
+
+
+def candidate_indexes(conn: sqlite3.Connection, queries, columns, indexed):
+    """
+    (table, columns) candidates for tables the plans scan, from the columns each query mentions.
+    """
+    candidates = set()
+    for sql in queries:
+        try:
+            plan = sql_plan.explain(conn, sql)
+        except sqlite3.Error:
+            continue
+        words = {w.lower() for w in re.findall(r"[A-Za-z_][A-Za-z0-9_]*", sql)}
+        for table in sql_plan.scanned_tables(plan, sql_plan.table_aliases(sql, columns)):
+            # The INTEGER PRIMARY KEY is the rowid and already indexed
+            used = [name for name, is_rowid in columns[table] if name.lower() in words and not is_rowid]
+            for name in used:
+                candidates.add((table, (name,)))
+            if len(used) > 1:
+                candidates.add((table, tuple(used)))
+    return sorted(c for c in candidates if (c[0], tuple(n.lower() for n in c[1])) not in indexed)
+
+
+def index_name(table: str, cols) -> str:
+    return f"adv_{table}_{'_'.join(c.lower() for c in cols)}"
+
+
+def create_index_sql(table: str, cols) -> str:
+    column_list = ", ".join(f'"{c}"' for c in cols)
+    return f'CREATE INDEX IF NOT EXISTS "{index_name(table, cols)}" ON "{table}" ({column_list})'
+
+
+def query_costs(conn, queries: Counter, max_steps: int, fallback=None, failed=None):
+    """
+    VM steps per query, replayed with PRAGMA query_only on; queries that fail
+    keep their `fallback` cost and are appended to `failed` if given.
+    """
+    costs = {}
+    # Only the advisor's own CREATE INDEX / ANALYZE may write, between replays
+    conn.execute("PRAGMA query_only = ON")
+    try:
+        for sql in queries:
+            steps = vm_steps(conn, sql, max_steps)
+            if steps is None and failed is not None:
+                failed.append(sql)
+            costs[sql] = steps if steps is not None else (fallback or {}).get(sql, 0)
+    finally:
+        conn.execute("PRAGMA query_only = OFF")
+    return costs
+
+
+def saving(queries: Counter, before, after) -> float:
+    """
+    Average fractional saving per query, weighted by how often it was logged.
+    """
+    weight = sum(queries.values())
+    return sum(
+        count * (before[sql] - after[sql]) / before[sql]
+        for sql, count in queries.items() if before[sql]
+    ) / weight
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose indexes for logged SQL Q&A queries.")
+    parser.add_argument("--log", default=DEFAULT_LOG)
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument("--analytics", default=DEFAULT_ANALYTICS,
+                        help='analytics tables to attach as "analytics" ("" to skip)')
+    parser.add_argument("--max-indexes", type=int, default=5)
+    parser.add_argument("--min-gain", type=float, default=0.02, help="minimum average saving per query to keep an index")
+    parser.add_argument("--max-steps", type=int, default=50_000_000, help="VM-step cap per query replay")
+    parser.add_argument("--output", help="write an optimized copy of the database here")
+    args = parser.parse_args()
+
+    rejected = []
+    queries = load_queries(args.log, rejected)
+    if rejected:
+        print(f"Ignoring {len(rejected)} logged statements that are not SELECT-only:")
+        for sql in rejected:
+            print(f"  {sql[:100]}")
+    if not queries:
+        print(f"No queries in {args.log}")
+        sys.exit(1)
+
+    source = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    # uri=True so the ATTACH below honours mode=ro
+    conn = sqlite3.connect("file::memory:", uri=True)
+    source.backup(conn)
+    source.close()
+    if args.analytics and os.path.exists(args.analytics):
+        conn.execute("ATTACH DATABASE ? AS analytics", (f"file:{args.analytics}?mode=ro",))
+    elif args.analytics:
+        print(f"{args.analytics} not found; queries on the analytics tables will fail to replay")
+
+    failed = []
+    baseline = query_costs(conn, queries, args.max_steps, failed=failed)
+    if failed:
+        print(f"Skipping {len(failed)} queries that fail to replay:")
+        for sql in failed:
+            print(f"  {sql[:100]}")
+            del queries[sql]
+        if not queries:
+            sys.exit(1)
+
+    columns = table_columns(conn)
+    candidates = candidate_indexes(conn, queries, columns, existing_indexes(conn))
+    print(f"{len(queries)} distinct queries ({sum(queries.values())} logged), {len(candidates)} candidate indexes")
+    print(f"baseline: {sum(baseline[q] * n for q, n in queries.items())} weighted VM steps")
+
+    chosen = []
+    current = baseline
+    while candidates and len(chosen) < args.max_indexes:
+        best = None
+        for table, cols in candidates:
+            conn.execute(create_index_sql(table, cols))
+            conn.execute("ANALYZE main")  # the attached analytics file is read-only
+            costs = query_costs(conn, queries, args.max_steps, current)
+            conn.execute(f'DROP INDEX "{index_name(table, cols)}"')
+            gain = saving(queries, current, costs)
+            if best is None or gain > best[0]:
+                best = (gain, table, cols, costs)
+
+        gain, table, cols, costs = best
+        if gain < args.min_gain:
+            break
+        conn.execute(create_index_sql(table, cols))
+        conn.execute("ANALYZE main")
+        print(f"  + {create_index_sql(table, cols)}: {gain:.1%} average saving per query")
+        chosen.append((table, cols))
+        candidates.remove((table, cols))
+        current = costs
+
+    if not chosen:
+        print("No index saves enough to be worth adding.")
+        return
+
+    print("Largest per-query savings:")
+    for sql in sorted(queries, key=lambda q: baseline[q] - current[q], reverse=True)[:5]:
+        print(f"  {baseline[sql]:>10} -> {current[sql]:>10}  {sql[:100]}")
+
+    print("\n".join(create_index_sql(t, c) + ";" for t, c in chosen))
+
+    if args.output:
+        target = sqlite3.connect(args.output)
+        conn.backup(target)
+        target.execute("ANALYZE")
+        target.commit()
+        target.close()
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+EXPLAIN QUERY PLAN helpers and the SELECT-only check, shared by sql_qa's
+pre-flight checks and the offline index advisor (sql_index_advisor.py).
+
+The estimate is deliberately rough: a full SCAN of a table (or of one of its
+indexes) visits every row, a SEARCH is counted as one row per outer row, and
+loops under the same parent nest, so their row counts multiply. A correlated
+subquery runs once per row of the loops around it, and building an automatic
+index is one pass over its table. That is enough to tell a few-thousand-row
+scan from a multi-million-row nested scan before running it.
+"""
+import re
+import sqlite3
+from typing import Dict, List, Tuple
+
+# Words that can follow a table name but are not aliases
+_NOT_ALIASES = {
+    "on", "using", "where", "join", "inner", "left", "right", "full", "outer", "cross",
+    "natural", "group", "order", "limit", "having", "window", "union", "except",
+    "intersect", "as", "and", "or", "not", "indexed", "set", "values", "select",
+}
+
+_LOOP = re.compile(r"^(SCAN|SEARCH) (\S+)")
+
+
+def is_select_only(sql: str) -> bool:
+    """
+    Very conservative SQL safety check:
+    - Must start with SELECT or WITH
+    - Must not contain any write/DDL keywords
+    """
+    s = (sql or "").strip().strip(";").lower()
+
+    if not (s.startswith("select") or s.startswith("with")):
+        return False
+
+    banned = [
+        "insert", "update", "delete", "drop", "alter", "create", "replace",
+        "truncate", "attach", "detach", "pragma", "vacuum", "reindex",
+        "grant", "revoke"
+    ]
+    # Word boundary check
+    for kw in banned:
+        if re.search(rf"\b{kw}\b", s):
+            return False
+
+    return True
+
+
+def table_row_counts(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Row count per user table of every attached database, keyed by
+    lower-cased table name.
+    """
+    counts = {}
+    for schema in [r[1] for r in conn.execute("PRAGMA database_list").fetchall() if r[1] != "temp"]:
+        for (t,) in conn.execute(
+            f"SELECT name FROM \"{schema}\".sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+        ).fetchall():
+            counts.setdefault(t.lower(), conn.execute(f'SELECT COUNT(*) FROM "{schema}"."{t}"').fetchone()[0])
+    return counts
+
+
+def table_aliases(sql: str, tables) -> Dict[str, str]:
+    """
+    Map every name a table goes by in `sql` (its own name and any alias) to
+    the lower-cased table name, as EXPLAIN QUERY PLAN reports the alias.
+    """
+    tables = {t.lower() for t in tables}
+    aliases = {t: t for t in tables}
+    for name, alias in re.findall(r"(?=\b(\w+)\s+(?:as\s+)?(\w+)\b)", sql, flags=re.IGNORECASE):
+        if name.lower() in tables and alias.lower() not in _NOT_ALIASES and alias.lower() not in tables:
+            aliases[alias.lower()] = name.lower()
+    return aliases
+
+
+def explain(conn: sqlite3.Connection, sql: str) -> List[Tuple[int, int, str]]:
+    """
+    (id, parent, detail) rows of EXPLAIN QUERY PLAN. Raises sqlite3.Error for invalid SQL.
+    """
+    return [(r[0], r[1], r[3]) for r in conn.execute(f"EXPLAIN QUERY PLAN {sql.strip().rstrip(';')}").fetchall()]
+
+
+def scanned_tables(plan, aliases: Dict[str, str]) -> List[str]:
+    """
+    Tables read in full (SCAN, with or without an index) somewhere in the plan.
+    """
+    tables = []
+    for _, _, detail in plan:
+        match = _LOOP.match(detail)
+        if match and match.group(1) == "SCAN":
+            table = aliases.get(match.group(2).lower())
+            if table and table not in tables:
+                tables.append(table)
+    return tables
+
+
+def estimate_rows(plan, row_counts: Dict[str, int], aliases: Dict[str, str]) -> int:
+    """
+    Rough number of rows the plan visits (see module docstring).
+    """
+    details = {node_id: (parent, detail) for node_id, parent, detail in plan}
+
+    # Nested-loop product of each group of sibling loops, keyed by parent id
+    products: Dict[int, int] = {}
+    # Building an automatic (temporary) index reads its table once
+    automatic = 0
+    for _, parent, detail in plan:
+        match = _LOOP.match(detail)
+        if not match:
+            continue
+        table_rows = max(1, row_counts.get(aliases.get(match.group(2).lower(), ""), 1))
+        rows = table_rows if match.group(1) == "SCAN" else 1
+        if "AUTOMATIC" in detail:
+            automatic += table_rows
+        products[parent] = products.get(parent, 1) * rows
+
+    def repeats(group: int, depth: int = 0) -> int:
+        # How many times a group runs: once, unless it sits under a correlated subquery
+        if group not in details or depth > 32:
+            return 1
+        parent, detail = details[group]
+        outer = repeats(parent, depth + 1)
+        if detail.startswith("CORRELATED"):
+            outer *= products.get(parent, 1)
+        return outer
+
+    return automatic + sum(product * repeats(group) for group, product in products.items())
+
+
+def plan_summary(plan) -> List[str]:
+    return [detail for _, _, detail in plan]
+
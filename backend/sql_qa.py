@@ -2,60 +2,228 @@ import os
 import re
 import json
 import sqlite3
-from typing import Any, Dict, List, Tuple
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-from openai import OpenAI
+import chinook_analytics
+import sql_plan
+import green
+from db_pool import ConnectionPool
+from llm_gateway import gateway
+from lru_cache import LRUCache
 
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY", ""))
+# OpenAI client shared with the chatbot; calls go through the gateway
+client = gateway.client
 
 # Where your Chinook SQLite DB lives on the VPS
 CHINOOK_DB_PATH = os.environ.get("CHINOOK_DB_PATH", os.path.join(os.path.dirname(__file__), "chinook.db"))
 
+# Pre-aggregated tables built from chinook.db (see chinook_analytics.py) and
+# attached to every connection as "analytics"; rebuilt when chinook.db changes ("" disables)
+ANALYTICS_PATH = os.environ.get("SQL_QA_ANALYTICS_PATH", chinook_analytics.default_path(CHINOOK_DB_PATH))
+_analytics_ready: Dict[Tuple[int, int], bool] = {}  # chinook.db signature -> analytics file usable
+
 # Basic guardrails
 MAX_ROWS_DEFAULT = int(os.environ.get("SQL_QA_MAX_ROWS", "50"))
 MODEL_DEFAULT = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
 
-
-def _is_select_only(sql: str) -> bool:
+# "compact" (short types, foreign keys, sample values) or "full" (declared column types only)
+SCHEMA_FORMAT = os.environ.get("SQL_QA_SCHEMA_FORMAT", "compact")
+SCHEMA_SAMPLE_CHARS = 20  # example values are cut to this length
+
+# (db_path, format) -> (mtime_ns, size, schema text)
+_schema_cache: Dict[Tuple[str, str], Tuple[int, int, str]] = {}
+_schema_lock = threading.Lock()
+
+# Long-lived read-only connections, so repeated queries hit SQLite's page cache
+POOL_SIZE = int(os.environ.get("SQL_QA_POOL_SIZE", "4"))
+POOL_TIMEOUT = float(os.environ.get("SQL_QA_POOL_TIMEOUT", "5"))
+MMAP_BYTES = int(os.environ.get("SQL_QA_MMAP_BYTES", str(256 * 2 ** 20)))
+PAGE_CACHE_KIB = int(os.environ.get("SQL_QA_PAGE_CACHE_KIB", "65536"))
+
+_pool: Optional[ConnectionPool] = None
+_pool_signature: Optional[Tuple[int, int]] = None
+_pool_lock = threading.Lock()
+
+# Per-query execution budget, enforced from SQLite's progress handler (0 disables a limit)
+MAX_VM_STEPS = int(os.environ.get("SQL_QA_MAX_VM_STEPS", "20000000"))
+MAX_QUERY_SECONDS = float(os.environ.get("SQL_QA_MAX_QUERY_SECONDS", "2"))
+PROGRESS_STEPS = 1000  # VM instructions between progress handler calls
+STREAM_BATCH_ROWS = 100
+
+# Generated SQL whose EXPLAIN QUERY PLAN estimate exceeds this many rows is
+# sent back to the model once for a rewrite, then rejected (0 disables the check)
+MAX_PLAN_ROWS = int(os.environ.get("SQL_QA_MAX_PLAN_ROWS", "1000000"))
+_row_counts: Dict[Tuple[int, int], Dict[str, int]] = {}  # db signature -> table row counts
+_plan_stats = {"checked": 0, "rejected": 0, "rewrites": 0, "rewrites_accepted": 0}
+
+# Candidate SQL generations raced per question (1 = one completion, the old behaviour).
+# The first candidate uses the usual temperature, the rest a higher one for variety.
+CANDIDATES_DEFAULT = int(os.environ.get("SQL_QA_CANDIDATES", "1"))
+MAX_CANDIDATES = int(os.environ.get("SQL_QA_MAX_CANDIDATES", "5"))
+CANDIDATE_TEMPERATURE = float(os.environ.get("SQL_QA_CANDIDATE_TEMPERATURE", "0.7"))
+CANDIDATE_TIMEOUT = float(os.environ.get("SQL_QA_CANDIDATE_TIMEOUT", "60"))
+_candidate_stats = {"races": 0, "won": 0, "failed": 0, "invalid_candidates": 0}
+
+# Executed and rejected queries, one JSON object per line, for sql_index_advisor.py ("" disables)
+QUERY_LOG_PATH = os.environ.get(
+    "SQL_QA_QUERY_LOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql_qa_queries.jsonl")
+)
+
+# Normalized question -> generated {sql, answer}, and (sql, max_rows) -> (columns, rows).
+# Both keys include the database file's (mtime_ns, size), so replacing chinook.db
+# makes every earlier entry unreachable.
+CACHE_TTL = float(os.environ.get("SQL_QA_CACHE_TTL", "86400"))
+_question_cache = LRUCache(int(os.environ.get("SQL_QA_QUESTION_CACHE_SIZE", "1000")), ttl=CACHE_TTL)
+_result_cache = LRUCache(int(os.environ.get("SQL_QA_RESULT_CACHE_SIZE", "500")), ttl=CACHE_TTL)
+
+
+def _short_type(declared: str) -> str:
+    t = (declared or "").upper()
+    if "INT" in t:
+        return "int"
+    if "CHAR" in t or "TEXT" in t or "CLOB" in t:
+        return "text"
+    if "DATE" in t or "TIME" in t:
+        return "datetime"
+    if any(k in t for k in ("NUMERIC", "DECIMAL", "REAL", "FLOA", "DOUB")):
+        return "num"
+    return t.lower() or "any"
+
+
+def _sample_value(cur: sqlite3.Cursor, tname: str, cname: str, schema: str = "main") -> str:
+    row = cur.execute(f'SELECT "{cname}" FROM "{schema}"."{tname}" WHERE "{cname}" IS NOT NULL LIMIT 1').fetchone()
+    if row is None:
+        return ""
+    value = str(row[0])
+    if len(value) > SCHEMA_SAMPLE_CHARS:
+        value = value[:SCHEMA_SAMPLE_CHARS] + "..."
+    return f"{cname}='{value}'"
+
+
+def _get_schema_text(conn: sqlite3.Connection, compact: bool = False) -> str:
     """
-    Very conservative SQL safety check:
-    - Must start with SELECT or WITH
-    - Must not contain any write/DDL keywords
-    """
-    s = (sql or "").strip().strip(";").lower()
-
-    if not (s.startswith("select") or s.startswith("with")):
-        return False
+    Return a schema description for prompting the model.
 
-    banned = [
-        "insert", "update", "delete", "drop", "alter", "create", "replace",
-        "truncate", "attach", "detach", "pragma", "vacuum", "reindex",
-        "grant", "revoke"
-    ]
-    # Word boundary check
-    for kw in banned:
-        if re.search(rf"\b{kw}\b", s):
-            return False
+    The compact format shortens column types, marks primary keys and
+    foreign keys (col->table, or col->table.col when the names differ) and
+    adds one example value per table, from a date column if there is one
+    (to show its format), else text:
+        albums(AlbumId int pk, Title text, ArtistId int->artists) e.g. Title='For Those About To R...'
 
-    return True
+    Tables of attached databases (the analytics tables) follow under a
+    header; their names are unique, so queries can use them unqualified.
+    """
+    cur = conn.cursor()
+    parts: List[str] = []
+    for (schema,) in [(r[1],) for r in cur.execute("PRAGMA database_list").fetchall() if r[1] != "temp"]:
+        if schema != "main":
+            parts.append(f"-- {schema}: denormalized and pre-aggregated sales built from the tables above; "
+                         "prefer them when they answer the question")
+        parts.extend(_schema_tables(cur, schema, compact))
+    return "\n".join(parts)
 
 
-def _get_schema_text(conn: sqlite3.Connection) -> str:
+def _schema_tables(cur: sqlite3.Cursor, schema: str, compact: bool) -> List[str]:
     """
-    Return a compact schema description for prompting the model.
+    One line per table of one attached database, in _get_schema_text's format.
     """
-    cur = conn.cursor()
+    # Names starting with "_" are bookkeeping (e.g. the analytics _build table)
     tables = cur.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        f"SELECT name FROM \"{schema}\".sqlite_master WHERE type='table' "
+        "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '\\_%' ESCAPE '\\' ORDER BY name"
     ).fetchall()
 
     parts: List[str] = []
     for (tname,) in tables:
-        cols = cur.execute(f"PRAGMA table_info({tname})").fetchall()
+        cols = cur.execute(f'PRAGMA "{schema}".table_info("{tname}")').fetchall()
         # cols: cid, name, type, notnull, dflt_value, pk
-        col_desc = ", ".join([f"{c[1]} {c[2]}" for c in cols])
-        parts.append(f"{tname}({col_desc})")
-    return "\n".join(parts)
+        if not compact:
+            col_desc = ", ".join([f"{c[1]} {c[2]}" for c in cols])
+            parts.append(f"{tname}({col_desc})")
+            continue
+
+        # fks: id, seq, table, from, to, on_update, on_delete, match
+        fks = {
+            fk[3]: fk[2] if fk[4] == fk[3] else f"{fk[2]}.{fk[4]}"
+            for fk in cur.execute(f'PRAGMA "{schema}".foreign_key_list("{tname}")').fetchall()
+        }
+        col_desc = []
+        for c in cols:
+            desc = f"{c[1]} {_short_type(c[2])}"
+            if c[5]:
+                desc += " pk"
+            if c[1] in fks:
+                desc += f"->{fks[c[1]]}"
+            col_desc.append(desc)
+
+        candidates = [c for c in cols if not c[5] and c[1] not in fks]
+        sampled = next((c[1] for c in candidates if _short_type(c[2]) == "datetime"), None) \
+            or next((c[1] for c in candidates if _short_type(c[2]) == "text"), None)
+        sample = _sample_value(cur, tname, sampled, schema) if sampled else ""
+        parts.append(f"{tname}({', '.join(col_desc)})" + (f" e.g. {sample}" if sample else ""))
+    return parts
+
+
+def _db_signature(db_path: str) -> Tuple[int, int]:
+    """
+    (mtime_ns, size) of a database file; changes whenever the file is replaced.
+    """
+    st = os.stat(db_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _analytics_available(signature: Tuple[int, int]) -> bool:
+    """
+    Make sure the analytics file matches this chinook.db signature, building
+    it if needed. Checked once per signature; False if disabled or the build failed.
+    """
+    if not ANALYTICS_PATH:
+        return False
+    ready = _analytics_ready.get(signature)
+    if ready is None:
+        ready = _analytics_ready[signature] = chinook_analytics.ensure_analytics(CHINOOK_DB_PATH, ANALYTICS_PATH)
+    return ready
+
+
+def _attach_analytics(conn: sqlite3.Connection) -> None:
+    # The connection must have been opened with uri=True for the URI to apply
+    conn.execute("ATTACH DATABASE ? AS analytics", (f"file:{ANALYTICS_PATH}?mode=ro&immutable=1",))
+
+
+def get_schema_text(db_path: str = CHINOOK_DB_PATH, schema_format: str = SCHEMA_FORMAT) -> str:
+    """
+    Schema text for a database file, rendered once and reused until the
+    file's mtime or size changes. For chinook.db it includes the analytics tables.
+    """
+    signature = _db_signature(db_path)
+    key = (db_path, schema_format)
+    cached = _schema_cache.get(key)
+    if cached and cached[:2] == signature:
+        return cached[2]
+
+    with _schema_lock:
+        cached = _schema_cache.get(key)
+        if cached and cached[:2] == signature:
+            return cached[2]
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            if db_path == CHINOOK_DB_PATH and _analytics_available(signature):
+                _attach_analytics(conn)
+            text = _get_schema_text(conn, compact=(schema_format == "compact"))
+        finally:
+            conn.close()
+        _schema_cache[key] = (*signature, text)
+        return text
+
+
+def warm_schema_cache() -> None:
+    """
+    Render the Chinook schema ahead of the first question (called at app startup).
+    """
+    get_schema_text(CHINOOK_DB_PATH, SCHEMA_FORMAT)
 
 
 
@@ -66,91 +234,523 @@ def log_debug(msg):
     except:
         pass
 
-def sql_qa(question: str, session_id: str, max_rows: int = MAX_ROWS_DEFAULT) -> Dict[str, Any]:
-    log_debug(f"sql_qa called with question: {question}")
-    
-    if not client.api_key:
-        log_debug("ERROR: Missing OPENAI_API_KEY")
-        return {"error": "Server is missing OPENAI_API_KEY."}
 
+def log_query(sql: str, **fields) -> None:
+    """
+    Append a query to the query log read by sql_index_advisor.py.
+    """
+    if not QUERY_LOG_PATH:
+        return
+    try:
+        with open(QUERY_LOG_PATH, "a") as f:
+            f.write(json.dumps({"ts": time.time(), "sql": sql, **fields}) + "\n")
+    except OSError:
+        pass
 
-    question = (question or "").strip()
-    if not question:
-        return {"error": "Missing question."}
+def normalize_question(question: str) -> str:
+    """
+    Cache key for a question: case, punctuation and spacing are ignored, so
+    "Top 5 genres?" and "top 5 genres" share an entry.
+    """
+    text = unicodedata.normalize("NFKC", question).lower()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
 
-    # Read-only SQLite connection
-    # uri mode + mode=ro prevents writes even if something slips through
-    db_uri = f"file:{CHINOOK_DB_PATH}?mode=ro"
-    conn = sqlite3.connect(db_uri, uri=True)
-    conn.row_factory = sqlite3.Row
 
+def _sql_messages(question: str) -> List[Dict[str, str]]:
+    """
+    System prompt and schema + question for generating SQL.
+    """
+    schema_text = get_schema_text(CHINOOK_DB_PATH)
+
+    system = (
+        "You are a senior data analyst. You answer questions about the Chinook SQLite database.\n"
+        "You MUST return valid SQLite SQL.\n"
+        "Rules:\n"
+        "- Return ONLY a JSON object with keys: sql, answer.\n"
+        "- sql must be a single SQLite query.\n"
+        "- sql must be READ-ONLY: SELECT or WITH only.\n"
+        "- Prefer limiting results (LIMIT) when appropriate.\n"
+    )
+
+    user = (
+        f"SCHEMA:\n{schema_text}\n\n"
+        f"QUESTION:\n{question}\n\n"
+        f"Return JSON only."
+    )
+
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+
+def _generate_sql(question: str, messages: Optional[List[Dict[str, str]]] = None,
+                  temperature: float = 0.2) -> Dict[str, Any]:
+    """
+    Ask the model for {sql, answer}. Returns an {"error": ...} dict if the
+    reply is not valid JSON or the SQL is empty or unsafe.
+    """
+    completion = gateway.complete(
+        messages or _sql_messages(question),
+        model=MODEL_DEFAULT,
+        temperature=temperature,
+    )
+
+    content = completion.choices[0].message.content or ""
+
+    # Attempt to parse JSON response
+    # Model might wrap in ```json ... ``` so strip fences.
+    content_stripped = re.sub(r"^```(?:json)?\s*|\s*```$", "", content.strip(), flags=re.IGNORECASE)
     try:
-        schema_text = _get_schema_text(conn)
-
-        system = (
-            "You are a senior data analyst. You answer questions about the Chinook SQLite database.\n"
-            "You MUST return valid SQLite SQL.\n"
-            "Rules:\n"
-            "- Return ONLY a JSON object with keys: sql, answer.\n"
-            "- sql must be a single SQLite query.\n"
-            "- sql must be READ-ONLY: SELECT or WITH only.\n"
-            "- Prefer limiting results (LIMIT) when appropriate.\n"
-        )
-
-        user = (
-            f"SCHEMA:\n{schema_text}\n\n"
-            f"QUESTION:\n{question}\n\n"
-            f"Return JSON only."
-        )
-
-        completion = client.chat.completions.create(
-            model=MODEL_DEFAULT,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            temperature=0.2,
-        )
-
-        content = completion.choices[0].message.content or ""
-
-        # Attempt to parse JSON response
-        # Model might wrap in ```json ... ``` so strip fences.
-        content_stripped = re.sub(r"^```(?:json)?\s*|\s*```$", "", content.strip(), flags=re.IGNORECASE)
-        try:
-            payload = json.loads(content_stripped)
-        except Exception as e:
-            log_debug(f"JSON Parse Error: {e}, Content: {content}")
-            return {"error": "Model did not return valid JSON.", "raw": content}
+        payload = json.loads(content_stripped)
+    except Exception as e:
+        log_debug(f"JSON Parse Error: {e}, Content: {content}")
+        return {"error": "Model did not return valid JSON.", "raw": content}
+
+    sql = (payload.get("sql") or "").strip()
+    answer = (payload.get("answer") or "").strip()
+
+    if not sql:
+        return {"error": "Model returned empty SQL.", "raw": content}
+
+    if not sql_plan.is_select_only(sql):
+        return {"error": "Rejected unsafe SQL (must be SELECT/WITH only).", "sql": sql}
 
-        sql = (payload.get("sql") or "").strip()
-        answer = (payload.get("answer") or "").strip()
+    return {"sql": sql, "answer": answer}
 
-        if not sql:
-            return {"error": "Model returned empty SQL.", "raw": content}
 
-        if not _is_select_only(sql):
-            return {"error": "Rejected unsafe SQL (must be SELECT/WITH only).", "sql": sql}
+def _rewrite_sql(question: str, rejected: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Give the model its rejected query and plan and ask for a cheaper one.
+    """
+    plan = "\n".join(rejected.get("plan", []))
+    messages = _sql_messages(question) + [
+        {"role": "assistant", "content": json.dumps({"sql": rejected["sql"]})},
+        {"role": "user", "content": (
+            f"That query is too expensive: {rejected['error']}\n"
+            f"QUERY PLAN:\n{plan}\n\n"
+            "Rewrite it to answer the same question without scanning large tables "
+            "inside other loops: join on primary/foreign key columns and aggregate "
+            "before joining where possible. Return JSON only."
+        )},
+    ]
+    return _generate_sql(question, messages)
 
-        # Enforce a LIMIT if missing and query could be large
-        sql_lower = sql.lower()
-        if "limit" not in sql_lower:
-            sql = sql.rstrip(";") + f" LIMIT {max_rows};"
 
+def _enforce_limit(sql: str, max_rows: int) -> str:
+    # Enforce a LIMIT if missing and query could be large
+    sql_lower = sql.lower()
+    if "limit" not in sql_lower:
+        sql = sql.rstrip(";") + f" LIMIT {max_rows};"
+    return sql
+
+
+def _connect_readonly(db_path: str, analytics: bool = False) -> sqlite3.Connection:
+    """
+    Open a read-only connection tuned for a file that never changes in place,
+    with the analytics tables attached if `analytics`.
+    """
+    # uri mode + mode=ro prevents writes even if something slips through;
+    # immutable=1 also skips file locking and change detection
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only = 1")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_BYTES}")
+    conn.execute(f"PRAGMA cache_size = -{PAGE_CACHE_KIB}")
+    if analytics:
+        _attach_analytics(conn)
+    return conn
+
+
+def _connection_pool(signature: Tuple[int, int]) -> ConnectionPool:
+    """
+    Pool of read-only connections to chinook.db. immutable=1 means SQLite
+    won't notice the file being replaced, so a new signature gets a new pool
+    (after the analytics file has been rebuilt to match).
+    """
+    global _pool, _pool_signature
+    with _pool_lock:
+        if _pool is None or _pool_signature != signature:
+            if _pool is not None:
+                _pool.close_all()
+            analytics = _analytics_available(signature)
+            _pool = ConnectionPool(
+                lambda: _connect_readonly(CHINOOK_DB_PATH, analytics),
+                max_size=POOL_SIZE,
+                wait_timeout=POOL_TIMEOUT,
+                # Local file: no health checks, and keep connections (and their page cache) indefinitely
+                health_check_after=float("inf"),
+                max_idle=float("inf"),
+            )
+            _pool_signature = signature
+        return _pool
+
+
+class QueryBudgetExceeded(Exception):
+    """A query ran past its VM-step or wall-clock budget, or was cancelled."""
+
+
+class QueryGovernor:
+    """
+    Enforces a query's budget from SQLite's progress handler, which runs every
+    PROGRESS_STEPS VM instructions; returning non-zero aborts the statement.
+    Only time spent inside SQLite counts, so a slow streaming client does not
+    use up the budget.
+
+    Args:
+        max_steps (int): VM instructions allowed (counted in PROGRESS_STEPS units); 0 = unlimited.
+        max_seconds (float): Seconds allowed inside SQLite; 0 = unlimited.
+    """
+
+    def __init__(self, max_steps: int = MAX_VM_STEPS, max_seconds: float = MAX_QUERY_SECONDS):
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.steps = 0
+        self.seconds = 0.0
+        self.cancelled = False
+        self.reason: Optional[str] = None
+        self._call_started = 0.0
+
+    def cancel(self) -> None:
+        """Abort the running statement at its next progress check."""
+        self.cancelled = True
+
+    def _progress(self) -> int:
+        self.steps += PROGRESS_STEPS
+        if self.cancelled:
+            self.reason = "cancelled"
+        elif self.max_steps and self.steps > self.max_steps:
+            self.reason = f"over {self.max_steps} VM steps"
+        elif self.max_seconds and self.seconds + time.monotonic() - self._call_started > self.max_seconds:
+            self.reason = f"over {self.max_seconds}s"
+        return 1 if self.reason else 0
+
+    def run(self, conn: sqlite3.Connection, fn, *args):
+        """
+        Call fn(*args) (an execute/fetch on `conn`) under the budget.
+        Raises QueryBudgetExceeded if the progress handler aborted it.
+        """
+        self._call_started = time.monotonic()
+        conn.set_progress_handler(self._progress, PROGRESS_STEPS)
+        try:
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            if self.reason:
+                raise QueryBudgetExceeded(f"Query stopped: {self.reason}") from e
+            raise
+        finally:
+            conn.set_progress_handler(None, PROGRESS_STEPS)
+            self.seconds += time.monotonic() - self._call_started
+
+    def stats(self) -> Dict[str, Any]:
+        return {"elapsed_ms": round(self.seconds * 1000, 3), "vm_steps": self.steps}
+
+
+def _run_query(sql: str, max_rows: int, signature: Tuple[int, int]) -> Tuple[List[str], List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Execute read-only SQL on a pooled connection under the execution budget.
+
+    Returns:
+        tuple: (columns, rows as dicts, {"elapsed_ms", "vm_steps"}).
+    """
+    governor = QueryGovernor()
+    with _connection_pool(signature).connection() as conn:
         cur = conn.cursor()
-        cur.execute(sql)
-        rows = cur.fetchmany(max_rows)
-        columns = [d[0] for d in cur.description] if cur.description else []
+        try:
+            governor.run(conn, cur.execute, sql)
+            rows = governor.run(conn, cur.fetchmany, max_rows)
+            columns = [d[0] for d in cur.description] if cur.description else []
+        finally:
+            cur.close()
+
+    # Convert sqlite3.Row to regular dicts
+    return columns, [dict(r) for r in rows], governor.stats()
 
-        # Convert sqlite3.Row to regular dicts
-        rows_out = [dict(r) for r in rows]
 
+def _check_plan(sql: str, signature: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+    """
+    Pre-flight check with EXPLAIN QUERY PLAN. Returns None if the query looks
+    affordable, else an {"error": ...} dict (with the plan and row estimate
+    when it is too expensive).
+    """
+    with _connection_pool(signature).connection() as conn:
+        try:
+            plan = sql_plan.explain(conn, sql)
+        except sqlite3.Error as e:
+            return {"error": f"Invalid SQL: {e}", "sql": sql}
+        counts = _row_counts.get(signature)
+        if counts is None:
+            counts = _row_counts[signature] = sql_plan.table_row_counts(conn)
+
+    _plan_stats["checked"] += 1
+    estimated = sql_plan.estimate_rows(plan, counts, sql_plan.table_aliases(sql, counts))
+    if MAX_PLAN_ROWS and estimated > MAX_PLAN_ROWS:
         return {
+            "error": f"Rejected expensive SQL: its plan reads about {estimated} rows (limit {MAX_PLAN_ROWS}).",
             "sql": sql,
-            "columns": columns,
-            "rows": rows_out,
-            "answer": answer or "Done."
+            "plan": sql_plan.plan_summary(plan),
+            "estimated_rows": estimated,
         }
+    return None
+
+
+def _candidate_worker(question: str, temperature: float, results) -> None:
+    try:
+        results.put(_generate_sql(question, temperature=temperature))
+    except Exception as e:
+        results.put({"error": f"Model request failed: {e}"})
 
+
+def _race_candidates(question: str, max_rows: int, signature: Tuple[int, int], n: int) -> Dict[str, Any]:
+    """
+    Generate `n` candidate queries concurrently and validate each as it
+    arrives (JSON, safety, plan check, execution). The first that runs wins
+    and the remaining completions are cancelled. Returns {"generated", "sql",
+    "result"}, or the last candidate's error if none of them ran.
+    """
+    _candidate_stats["races"] += 1
+    results = green.Queue()
+    workers = [
+        green.spawn(_candidate_worker, question, 0.2 if i == 0 else CANDIDATE_TEMPERATURE, results)
+        for i in range(n)
+    ]
+    error: Dict[str, Any] = {"error": "No candidate SQL arrived in time."}
+    deadline = time.monotonic() + CANDIDATE_TIMEOUT
+    try:
+        for _ in range(n):
+            try:
+                generated = results.get(timeout=max(0.0, deadline - time.monotonic()))
+            except green.Empty:
+                break
+            if "error" in generated:
+                _candidate_stats["invalid_candidates"] += 1
+                error = generated
+                continue
+
+            sql = _enforce_limit(generated["sql"], max_rows)
+            problem = _check_plan(sql, signature) if MAX_PLAN_ROWS else None
+            if problem is None:
+                try:
+                    result = _run_query(sql, max_rows, signature)
+                except (QueryBudgetExceeded, sqlite3.Error) as e:
+                    problem = {"error": str(e), "sql": sql}
+            if problem:
+                log_query(sql, rejected=True, reason=problem["error"])
+                _candidate_stats["invalid_candidates"] += 1
+                error = problem
+                continue
+
+            log_query(sql, **result[2])
+            _candidate_stats["won"] += 1
+            return {"generated": generated, "sql": sql, "result": result}
+        _candidate_stats["failed"] += 1
+        return error
     finally:
-        conn.close()
+        for worker in workers:
+            green.cancel(worker)
+
+
+def _prepare_query(question: str, max_rows: int, candidates: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Validate the question and get its SQL, from the question cache or the
+    model. Returns an {"error": ...} dict, or the SQL (with LIMIT enforced),
+    the answer text and what's needed to cache the question once it runs.
+    With `candidates` > 1 (default SQL_QA_CANDIDATES) the model is raced and the winner's rows come back
+    under "result" as well.
+    """
+    if not client.api_key:
+        log_debug("ERROR: Missing OPENAI_API_KEY")
+        return {"error": "Server is missing OPENAI_API_KEY."}
+
+    question = (question or "").strip()
+    if not question:
+        return {"error": "Missing question."}
+
+    # A repeated question skips the model; a repeated query skips the database
+    signature = _db_signature(CHINOOK_DB_PATH)
+    question_key = (normalize_question(question), signature)
+    generated: Optional[Dict[str, Any]] = _question_cache.get(question_key)
+    cached = generated is not None
+
+    # Several candidates: the race already validated and ran the winner
+    candidates = max(1, min(candidates or CANDIDATES_DEFAULT, MAX_CANDIDATES))
+    if not cached and candidates > 1:
+        winner = _race_candidates(question, max_rows, signature, candidates)
+        if "error" in winner:
+            return winner
+        return {
+            "sql": winner["sql"],
+            "answer": winner["generated"]["answer"] or "Done.",
+            "cached": False,
+            "signature": signature,
+            "question_key": question_key,
+            "generated": winner["generated"],
+            "result": winner["result"],
+        }
+
+    if generated is None:
+        generated = _generate_sql(question)
+        if "error" in generated:
+            return generated
+
+    sql = _enforce_limit(generated["sql"], max_rows)
+
+    # Cached SQL already passed; new SQL gets one rewrite if its plan is too expensive
+    if not cached and MAX_PLAN_ROWS:
+        problem = _check_plan(sql, signature)
+        if problem and "estimated_rows" in problem:
+            log_query(sql, rejected=True, estimated_rows=problem["estimated_rows"])
+            _plan_stats["rewrites"] += 1
+            rewritten = _rewrite_sql(question, problem)
+            if "error" not in rewritten:
+                rewritten_sql = _enforce_limit(rewritten["sql"], max_rows)
+                retry_problem = _check_plan(rewritten_sql, signature)
+                if retry_problem is None:
+                    _plan_stats["rewrites_accepted"] += 1
+                    generated, sql, problem = rewritten, rewritten_sql, None
+        if problem:
+            _plan_stats["rejected"] += 1
+            return problem
+
+    return {
+        "sql": sql,
+        "answer": generated["answer"] or "Done.",
+        "cached": cached,
+        "signature": signature,
+        "question_key": question_key,
+        "generated": generated,
+    }
+
+
+def sql_qa(question: str, session_id: str, max_rows: int = MAX_ROWS_DEFAULT,
+           candidates: Optional[int] = None) -> Dict[str, Any]:
+    log_debug(f"sql_qa called with question: {question}")
+
+    prepared = _prepare_query(question, max_rows, candidates)
+    if "error" in prepared:
+        return prepared
+    sql, signature = prepared["sql"], prepared["signature"]
+
+    result_key = (sql, max_rows, signature)
+    result = prepared.get("result")
+    if result is not None:
+        _result_cache.set(result_key, result)
+    else:
+        result = _result_cache.get(result_key)
+    result_cached = result is not None and "result" not in prepared
+    if result is None:
+        try:
+            result = _run_query(sql, max_rows, signature)
+        except QueryBudgetExceeded as e:
+            log_query(sql, rejected=True, reason=str(e))
+            return {"error": str(e), "sql": sql}
+        _result_cache.set(result_key, result)
+        log_query(sql, **result[2])
+
+    # Only remember SQL that actually ran
+    if not prepared["cached"]:
+        _question_cache.set(prepared["question_key"], prepared["generated"])
+
+    columns, rows_out, query_stats = result
+    return {
+        "sql": sql,
+        "columns": columns,
+        "rows": rows_out,
+        "answer": prepared["answer"],
+        "cached": prepared["cached"],
+        "result_cached": result_cached,
+        # Work done for this request; zero when the rows came from the result cache
+        "elapsed_ms": 0.0 if result_cached else query_stats["elapsed_ms"],
+        "vm_steps": 0 if result_cached else query_stats["vm_steps"],
+    }
+
+
+def sql_qa_stream(question: str, session_id: str, max_rows: int = MAX_ROWS_DEFAULT,
+                  candidates: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Like sql_qa, but yields the result as a sequence of messages for NDJSON
+    streaming instead of materializing every row:
+        {"sql", "answer", "columns", "cached"}, then {"row": {...}} per row,
+        then {"done": true, "rows", "elapsed_ms", "vm_steps"}.
+    Any failure is sent as a final {"error": ...} message.
+    """
+    log_debug(f"sql_qa_stream called with question: {question}")
+    try:
+        yield from _stream_messages(question, max_rows, candidates)
+    except Exception as e:
+        # Model, gateway (LLMBusy) and pool (PoolTimeout) failures end the stream with a message
+        log_debug(f"sql_qa_stream failed: {e}")
+        yield {"error": str(e)}
+
+
+def _stream_messages(question: str, max_rows: int, candidates: Optional[int]) -> Iterator[Dict[str, Any]]:
+    """
+    The messages of sql_qa_stream. Exceptions other than query errors propagate.
+    """
+    prepared = _prepare_query(question, max_rows, candidates)
+    if "error" in prepared:
+        yield prepared
+        return
+    sql, signature = prepared["sql"], prepared["signature"]
+    header = {"sql": sql, "answer": prepared["answer"], "cached": prepared["cached"]}
+
+    # Rows already cached for this query (or run by a candidate race) are
+    # replayed without touching the database
+    raced = prepared.get("result")
+    if raced is not None:
+        _result_cache.set((sql, max_rows, signature), raced)
+        _question_cache.set(prepared["question_key"], prepared["generated"])
+    result = raced or _result_cache.get((sql, max_rows, signature))
+    if result is not None:
+        columns, rows_out, query_stats = result
+        yield {**header, "columns": columns}
+        for row in rows_out:
+            yield {"row": row}
+        stats = query_stats if raced else {"elapsed_ms": 0.0, "vm_steps": 0}
+        yield {"done": True, "rows": len(rows_out), **stats}
+        return
+
+    governor = QueryGovernor()
+    sent = 0
+    try:
+        # The connection is held across yields; if the client disconnects, closing
+        # the generator raises GeneratorExit here and the `with` returns it to the pool
+        with _connection_pool(signature).connection() as conn:
+            cur = conn.cursor()
+            try:
+                governor.run(conn, cur.execute, sql)
+                if not prepared["cached"]:
+                    _question_cache.set(prepared["question_key"], prepared["generated"])
+                yield {**header, "columns": [d[0] for d in cur.description] if cur.description else []}
+
+                while sent < max_rows:
+                    rows = governor.run(conn, cur.fetchmany, min(STREAM_BATCH_ROWS, max_rows - sent))
+                    if not rows:
+                        break
+                    for r in rows:
+                        yield {"row": dict(r)}
+                    sent += len(rows)
+            finally:
+                cur.close()
+    except (QueryBudgetExceeded, sqlite3.Error) as e:
+        log_query(sql, rejected=True, reason=str(e))
+        yield {"error": str(e), "sql": sql, "rows": sent, **governor.stats()}
+        return
+
+    log_query(sql, **governor.stats())
+    yield {"done": True, "rows": sent, **governor.stats()}
+
+
+def sql_qa_stats() -> Dict[str, Any]:
+    """
+    Cache, connection pool, plan check and candidate race metrics for /api/sql_qa/stats.
+    """
+    return {
+        "question_cache": _question_cache.stats(),
+        "result_cache": _result_cache.stats(),
+        "schemas_cached": len(_schema_cache),
+        "analytics": {"path": ANALYTICS_PATH or None, "attached": _analytics_ready.get(_pool_signature, False)},
+        "db_pool": _pool.stats() if _pool is not None else None,
+        "plan_check": {"max_plan_rows": MAX_PLAN_ROWS, **_plan_stats},
+        "candidates": {"default": CANDIDATES_DEFAULT, **_candidate_stats},
+    }
@@ -0,0 +1,209 @@
+"""
+Batched, cached client for the Azure Translator text API (v3.0).
+
+The live-translation namespace (services/azure_live_ws.py) used to open a new
+HTTPS connection per final recognition result. Here every worker thread keeps
+a requests.Session, so connections are reused, translations are cached by
+(text, src, tgt), and texts submitted within `batch_window` seconds of each
+other, from any session, go out as one multi-element request per language
+pair. Identical texts waiting at the same time are sent once.
+
+Callers hand texts to submit() with a callback and return at once; the
+callback runs on a worker thread when the translation is ready (see
+caption_pipeline.py). Submitters include the Speech SDK's own OS threads,
+and gunicorn's eventlet worker patches threading and queue into green
+versions that such threads can't wake, so the workers, queue and locks come
+from green.OS*: real OS threads and primitives even under monkey-patching.
+AZURE_TRANSLATOR_ENDPOINT / _KEY / _REGION are read when a batch is sent.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import requests
+
+import green
+from lru_cache import LRUCache
+
+# Translator accepts up to 1000 elements and 50,000 characters per request
+MAX_REQUEST_ELEMENTS = 1000
+MAX_REQUEST_CHARS = 50000
+
+
+class TranslatorClient:
+    """
+    Args:
+        timeout (float): Seconds per Translator request.
+        batch_window (float): Seconds a text waits for others to share its request.
+        max_batch (int): Texts per request at most.
+        max_chars (int): A batch closes once it holds at least this many characters
+            (the last text added may take it past the limit).
+        cache_size (int): Translations kept in the LRU cache.
+        cache_ttl (float): Seconds a cached translation stays valid; None = forever.
+        workers (int): OS threads sending batches, each with its own keep-alive session.
+    """
+
+    def __init__(self, timeout=10.0, batch_window=0.02, max_batch=50, max_chars=10000,
+                 cache_size=5000, cache_ttl=None, workers=2):
+        self.timeout = timeout
+        self.batch_window = batch_window
+        self.max_batch = min(max_batch, MAX_REQUEST_ELEMENTS)
+        self.max_chars = min(max_chars, MAX_REQUEST_CHARS)
+        self.workers = workers
+
+        self.cache = LRUCache(cache_size, ttl=cache_ttl, lock=green.OSLock())
+        self._queue = green.OSQueue()
+        self._pending = {}  # (text, src, tgt) -> callbacks waiting for that translation
+        self._lock = green.OSLock()
+        self._threads = []
+        self._local = green.os_local()
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.requests = 0
+        self.texts_sent = 0
+        self.errors = 0
+        self.max_batch_seen = 0
+        self.last_request_ms = 0.0
+
+    def submit(self, text: str, src: str, tgt: str, callback) -> None:
+        """
+        Translate `text` from `src` to `tgt` (short codes, e.g. "en") and call
+        callback(translation) when done, from a worker thread unless the
+        answer was cached. The translation is "" if it failed or Translator
+        is not configured.
+        """
+        if not text:
+            callback("")
+            return
+        key = (text, src, tgt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            callback(cached)
+            return
+        with self._lock:
+            self.submitted += 1
+            waiters = self._pending.get(key)
+            if waiters is not None:
+                waiters.append(callback)
+                self.coalesced += 1
+                return
+            self._pending[key] = [callback]
+            if not self._threads:
+                for i in range(self.workers):
+                    self._threads.append(green.start_os_thread(self._run, name=f"translator-{i}"))
+        self._queue.put(key)
+
+    def _session(self) -> requests.Session:
+        # One session per worker thread, so its pooled connections stay on that thread
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        chars = len(batch[0][0])
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch and chars < self.max_chars:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                key = self._queue.get(timeout=remaining)
+            except green.Empty:
+                break
+            batch.append(key)
+            chars += len(key[0])
+        return batch
+
+    def _post(self, texts, src: str, tgt: str):
+        """
+        Translate a list of texts in one request; returns translations in order.
+        """
+        ep = (os.getenv("AZURE_TRANSLATOR_ENDPOINT") or "").rstrip("/")
+        key = os.getenv("AZURE_TRANSLATOR_KEY")
+        reg = os.getenv("AZURE_TRANSLATOR_REGION")  # optional depending on your resource
+        if not ep or not key:
+            return [""] * len(texts)
+
+        started = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            self.texts_sent += len(texts)
+            self.max_batch_seen = max(self.max_batch_seen, len(texts))
+        r = self._session().post(
+            f"{ep}/translate",
+            params={"api-version": "3.0", "to": tgt, "from": src},
+            headers={
+                "Ocp-Apim-Subscription-Key": key,
+                "Content-Type": "application/json",
+                **({"Ocp-Apim-Subscription-Region": reg} if reg else {}),
+            },
+            json=[{"Text": t} for t in texts],
+            timeout=self.timeout,
+        )
+        r.raise_for_status()
+        data = r.json()
+        with self._lock:
+            self.last_request_ms = round((time.monotonic() - started) * 1000, 3)
+        out = []
+        for i in range(len(texts)):
+            trs = data[i].get("translations") if isinstance(data, list) and i < len(data) else None
+            out.append((trs[0].get("text") if trs else "") or "")
+        return out
+
+    def _run_batch(self, batch):
+        # Translator takes one source and target per request, so split by language pair
+        groups = OrderedDict()
+        for text, src, tgt in batch:
+            groups.setdefault((src, tgt), []).append(text)
+
+        for (src, tgt), texts in groups.items():
+            try:
+                translations = self._post(texts, src, tgt)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                logging.info(f"Translator request for {len(texts)} texts ({src}->{tgt}) failed: {e}")
+                translations = [""] * len(texts)
+
+            for text, translation in zip(texts, translations):
+                key = (text, src, tgt)
+                if translation:
+                    self.cache.set(key, translation)
+                with self._lock:
+                    callbacks = self._pending.pop(key, [])
+                for callback in callbacks:
+                    try:
+                        callback(translation)
+                    except Exception as e:
+                        logging.info(f"Translation callback failed: {e}")
+
+    def _run(self):
+        while True:
+            self._run_batch(self._next_batch())
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "requests": self.requests,
+            "texts_sent": self.texts_sent,
+            "errors": self.errors,
+            "max_batch_seen": self.max_batch_seen,
+            "last_request_ms": self.last_request_ms,
+            "cache": self.cache.stats(),
+        }
+
+
+translator = TranslatorClient(
+    timeout=float(os.environ.get("TRANSLATOR_TIMEOUT", "10")),
+    batch_window=float(os.environ.get("TRANSLATOR_BATCH_WINDOW_MS", "20")) / 1000,
+    max_batch=int(os.environ.get("TRANSLATOR_MAX_BATCH", "50")),
+    cache_size=int(os.environ.get("TRANSLATOR_CACHE_SIZE", "5000")),
+    workers=int(os.environ.get("TRANSLATOR_WORKERS", "2")),
+)
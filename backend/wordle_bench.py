@@ -0,0 +1,189 @@
+"""
+Wordle solver benchmark and regression check.
+
+Replays complete games (every answer, or a seeded sample, against each opener)
+through the same solve_state() path /api/wordle/solve uses, always playing the
+top suggestion. Reports per-turn latency percentiles, throughput, peak RSS
+(including touched pages of the mmapped pattern table) and guesses-to-solve,
+plus micro-benchmarks of wordle_feedback, filter_words and score_words.
+
+    python wordle_bench.py --sample 500 --json bench.json
+    python wordle_bench.py --sample 500 --baseline bench.json   # exit 1 on regression
+"""
+import argparse
+import json
+import random
+import resource
+import sys
+import time
+
+import numpy as np
+
+import wordle_solver as ws
+
+MAX_TURNS = 20
+
+# Metrics compared against a baseline, and whether higher is worse
+REGRESSION_KEYS = {
+    "latency_ms_p50": True,
+    "latency_ms_p95": True,
+    "latency_ms_p99": True,
+    "turns_per_second": False,
+    "average_guesses": True,
+}
+
+
+def play(answer: str, opener: str, strategy: str, cold: bool, latencies: list, fallbacks: list) -> int:
+    """
+    Play one game and return the number of guesses used (MAX_TURNS + 1 if unsolved).
+    Turns where the tree strategy fell back to another one are appended to `fallbacks`.
+    """
+    history = []
+    guess = opener
+    for turn in range(1, MAX_TURNS + 1):
+        feedback = ws.wordle_feedback(answer, guess)
+        if feedback == "ggggg":
+            return turn
+        history.append((guess, feedback))
+
+        if cold:
+            ws.clear_caches()
+        started = time.perf_counter()
+        payload = ws.solve_state(tuple(history), 1, strategy)
+        latencies.append(time.perf_counter() - started)
+        if "fallback" in payload:
+            fallbacks.append(payload["fallback"])
+
+        if not payload["top_suggestions"]:
+            break
+        guess = payload["top_suggestions"][0]["word"]
+    return MAX_TURNS + 1
+
+
+def run_games(answers, openers, strategy: str, cold: bool) -> dict:
+    latencies = []
+    fallbacks = []
+    guesses = []
+    started = time.perf_counter()
+    for opener in openers:
+        for answer in answers:
+            guesses.append(play(answer, opener, strategy, cold, latencies, fallbacks))
+    elapsed = time.perf_counter() - started
+
+    ms = np.array(latencies) * 1000
+    solved = [g for g in guesses if g <= MAX_TURNS]
+    return {
+        "games": len(guesses),
+        "turns": len(latencies),
+        "elapsed_s": round(elapsed, 2),
+        "turns_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms_p50": round(float(np.percentile(ms, 50)), 3) if len(ms) else 0.0,
+        "latency_ms_p95": round(float(np.percentile(ms, 95)), 3) if len(ms) else 0.0,
+        "latency_ms_p99": round(float(np.percentile(ms, 99)), 3) if len(ms) else 0.0,
+        "latency_ms_max": round(float(ms.max()), 3) if len(ms) else 0.0,
+        "average_guesses": round(sum(solved) / len(solved), 4) if solved else 0.0,
+        "max_guesses": max(solved) if solved else 0,
+        "unsolved": len(guesses) - len(solved),
+        "fallback_turns": len(fallbacks),
+    }
+
+
+def time_per_call(fn, args_list) -> float:
+    started = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return round((time.perf_counter() - started) / len(args_list) * 1e6, 2)
+
+
+def micro_benchmarks(rng: random.Random, rounds: int = 200) -> dict:
+    words = ws.word_list
+    pairs = [(words[rng.randrange(len(words))], words[rng.randrange(len(words))]) for _ in range(rounds * 10)]
+
+    histories = []
+    for _ in range(rounds):
+        answer = words[rng.randrange(len(words))]
+        guesses = [words[rng.randrange(len(words))] for _ in range(rng.randint(1, 4))]
+        histories.append((words, guesses, [ws.wordle_feedback(answer, g) for g in guesses]))
+
+    remaining = [ws.filter_words(*h) for h in histories[:50]]
+    scoring = [(r, ws.calculate_letter_frequency(r)) for r in remaining]
+
+    return {
+        "wordle_feedback_us": time_per_call(ws.wordle_feedback, pairs),
+        "filter_words_us": time_per_call(ws.filter_words, histories),
+        "score_words_us": time_per_call(ws.score_words, scoring),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Return human-readable regressions beyond `tolerance` (fractional).
+    """
+    problems = []
+    for key, higher_is_worse in REGRESSION_KEYS.items():
+        old, new = baseline.get(key), results.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if (change > tolerance) if higher_is_worse else (change < -tolerance):
+            problems.append(f"{key}: {old} -> {new} ({change:+.1%})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Wordle solver.")
+    parser.add_argument("--openers", default="crane,slate,adieu", help="comma-separated opening guesses")
+    parser.add_argument("--strategy", default=ws.STRATEGY_DEFAULT, choices=ws.STRATEGIES)
+    parser.add_argument("--sample", type=int, default=500, help="answers per opener (0 = all words)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--cold", action="store_true", help="clear solver caches before every turn")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional regression")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    openers = [w.strip().lower() for w in args.openers.split(",") if w.strip()]
+    answers = list(ws.word_list)
+    if args.sample:
+        answers = rng.sample(answers, min(args.sample, len(answers)))
+
+    # Load the word list, pattern table and letter index outside the timings
+    setup_started = time.perf_counter()
+    ws.filter_words(ws.word_list, [openers[0]], ["bbbbb"])
+    setup_s = time.perf_counter() - setup_started
+    ws.clear_caches()
+
+    results = {
+        "strategy": args.strategy,
+        "openers": openers,
+        "answers": len(answers),
+        "cold": args.cold,
+        "setup_s": round(setup_s, 2),
+        **run_games(answers, openers, args.strategy, args.cold),
+        **micro_benchmarks(rng),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "cache": ws.cache_stats(),
+    }
+
+    for key, value in results.items():
+        if key != "cache":
+            print(f"{key:>20}: {value}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        if problems:
+            print("REGRESSIONS:")
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Bit-packed letter-constraint index for Wordle candidate filtering.
+
+Each (guess, feedback) pair implies cheap necessary conditions on the answer:
+greens fix a letter at a position, yellows and grays rule a letter out at a
+position, and the number of green/yellow marks per letter bounds how many
+copies the answer has (exactly that many if the letter was also marked gray).
+The index stores one packed bitset per condition, so pruning a whole history
+is a handful of byte-array ANDs before any exact feedback is computed.
+"""
+import numpy as np
+
+from wordle_patterns import letter_counts
+
+_MAX_COPIES = 5
+
+
+class LetterIndex:
+    """
+    Packed bitsets over a word list (as returned by word_letters()):
+      at[pos, letter]         -> words with `letter` at `pos`
+      at_least[letter, c - 1] -> words with at least c copies of `letter`
+    """
+
+    def __init__(self, letters: np.ndarray):
+        self.size = len(letters)
+        alphabet = np.arange(26, dtype=np.uint8)
+        self.at = np.packbits(letters.T[:, None, :] == alphabet[None, :, None], axis=-1)
+        copies = np.arange(1, _MAX_COPIES + 1, dtype=np.uint8)
+        self.at_least = np.packbits(letter_counts(letters).T[:, None, :] >= copies[None, :, None], axis=-1)
+        self._everything = np.packbits(np.ones(self.size, dtype=bool))
+
+    def mask(self, guesses, feedbacks) -> np.ndarray:
+        """
+        Boolean mask of words satisfying the letter constraints of every pair.
+        It is a superset of the exact matches; callers still verify survivors.
+        """
+        bits = self._everything.copy()
+        for guess, feedback in zip(guesses, feedbacks):
+            letters = [ord(ch) - ord("a") for ch in guess]
+            for pos, (letter, mark) in enumerate(zip(letters, feedback)):
+                if mark == "g":
+                    bits &= self.at[pos, letter]
+                else:
+                    bits &= ~self.at[pos, letter]
+
+            for letter in set(letters):
+                marks = [mark for l, mark in zip(letters, feedback) if l == letter]
+                present = sum(mark != "b" for mark in marks)
+                if present:
+                    bits &= self.at_least[letter, present - 1]
+                if "b" in marks:
+                    bits &= ~self.at_least[letter, present]
+        return np.unpackbits(bits, count=self.size).view(bool)
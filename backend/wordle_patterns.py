@@ -0,0 +1,201 @@
+"""
+Precomputed Wordle feedback patterns.
+
+Every guess/answer pair is encoded as a single base-3 number (one digit per
+position, b=0 / y=1 / g=2, position 0 least significant), so a pattern always
+fits in a uint8 (0..242). The full guess x answer table for words.txt is built
+once with NumPy and cached as a .npy file next to the word list, after which it
+is memory-mapped instead of rebuilt.
+
+Build the cache ahead of time (e.g. on deploy) with:
+
+    python wordle_patterns.py
+"""
+import hashlib
+import logging
+import os
+import time
+
+import numpy as np
+
+import green
+
+PATTERN_COUNT = 3 ** 5
+ALL_GREEN = PATTERN_COUNT - 1
+
+_DIGITS = {"b": 0, "y": 1, "g": 2}
+_WEIGHTS = [3 ** i for i in range(5)]
+
+_lock = green.OSLock()  # held by warm_pattern_matrix()'s OS thread while building
+_matrices = {}  # cache path -> loaded matrix
+
+
+def encode_feedback(feedback: str) -> int:
+    """
+    Encode a validated b/y/g feedback string as its base-3 pattern code.
+    """
+    return sum(_DIGITS[ch] * w for ch, w in zip(feedback, _WEIGHTS))
+
+
+def decode_pattern(code: int) -> str:
+    """
+    Inverse of encode_feedback().
+    """
+    out = []
+    for _ in range(5):
+        code, digit = divmod(int(code), 3)
+        out.append("byg"[digit])
+    return "".join(out)
+
+
+def word_letters(words) -> np.ndarray:
+    """
+    Return an (N, 5) uint8 array of letter indices (a=0 .. z=25).
+    """
+    if len(words) == 0:
+        return np.zeros((0, 5), dtype=np.uint8)
+    raw = np.frombuffer("".join(words).encode("ascii"), dtype=np.uint8)
+    return (raw - ord("a")).reshape(-1, 5)
+
+
+def letter_counts(letters: np.ndarray) -> np.ndarray:
+    """
+    Return an (N, 26) uint8 array with the number of times each letter occurs.
+    """
+    counts = np.zeros((len(letters), 26), dtype=np.uint8)
+    rows = np.arange(len(letters))
+    for pos in range(5):
+        np.add.at(counts, (rows, letters[:, pos]), 1)
+    return counts
+
+
+def pattern_block(guesses: np.ndarray, answers: np.ndarray, answer_counts: np.ndarray = None) -> np.ndarray:
+    """
+    Vectorized wordle_feedback(): return a (len(guesses), len(answers)) uint8
+    array of pattern codes.
+
+    A non-green guess letter is yellow when the answer still has more unmatched
+    copies of that letter than earlier non-green positions of the guess already
+    claimed, which is exactly the Counter-based rule in wordle_feedback().
+    """
+    if answer_counts is None:
+        answer_counts = letter_counts(answers)
+
+    greens = [guesses[:, i, None] == answers[None, :, i] for i in range(5)]
+    same = guesses[:, :, None] == guesses[:, None, :]  # (B, 5, 5) repeated letters in each guess
+
+    codes = np.zeros((len(guesses), len(answers)), dtype=np.uint8)
+    for i in range(5):
+        # Copies of guess[i] in the answer that were not used up by a green
+        available = answer_counts[:, guesses[:, i]].T.copy()
+        for k in range(5):
+            if same[:, i, k].any():
+                available -= greens[k] & same[:, i, k, None]
+
+        # Earlier non-green positions of the same letter get served first
+        claimed = np.zeros_like(available)
+        for k in range(i):
+            if same[:, i, k].any():
+                claimed += ~greens[k] & same[:, i, k, None]
+
+        yellow = ~greens[i] & (claimed < available)
+        codes += (greens[i] * np.uint8(2) + yellow) * np.uint8(_WEIGHTS[i])
+    return codes
+
+
+def build_pattern_matrix(letters: np.ndarray, block_size: int = 64) -> np.ndarray:
+    """
+    Compute the full guess x answer pattern table for a word list.
+    """
+    counts = letter_counts(letters)
+    matrix = np.empty((len(letters), len(letters)), dtype=np.uint8)
+    for start in range(0, len(letters), block_size):
+        stop = start + block_size
+        matrix[start:stop] = pattern_block(letters[start:stop], letters, counts)
+    return matrix
+
+
+def partition_entropy(codes: np.ndarray, block_size: int = 2048) -> np.ndarray:
+    """
+    Entropy in bits of the feedback partition each row of `codes` (guesses x
+    answers pattern codes) induces over the answers, assuming they are
+    equally likely.
+    """
+    total = codes.shape[1]
+    if total == 0:
+        return np.zeros(len(codes))
+
+    # H = log2(n) - sum(c * log2(c)) / n over the pattern bucket sizes c
+    sizes = np.arange(total + 1, dtype=np.float64)
+    c_log_c = np.zeros(total + 1)
+    c_log_c[1:] = sizes[1:] * np.log2(sizes[1:])
+
+    offsets = (np.arange(block_size, dtype=np.intp) * PATTERN_COUNT)[:, None]
+    scores = np.empty(len(codes))
+    for start in range(0, len(codes), block_size):
+        block = codes[start:start + block_size]
+        rows = len(block)
+        buckets = np.bincount((block + offsets[:rows]).ravel(), minlength=rows * PATTERN_COUNT)
+        scores[start:start + rows] = np.log2(total) - c_log_c[buckets.reshape(rows, PATTERN_COUNT)].sum(axis=1) / total
+    return scores
+
+
+def words_digest(words) -> str:
+    """
+    Short fingerprint of a word list, used to name and validate caches.
+    """
+    return hashlib.sha1("\n".join(words).encode("ascii")).hexdigest()[:12]
+
+
+def cache_path(words, directory: str) -> str:
+    """
+    Cache file for this exact word list; editing words.txt changes the name.
+    """
+    return os.path.join(directory, f"words.{words_digest(words)}.patterns.npy")
+
+
+def load_pattern_matrix(words, directory: str) -> np.ndarray:
+    """
+    Return the pattern table for `words`, memory-mapped from the .npy cache in
+    `directory`. Builds and writes the cache on first use; if the directory is
+    not writable the table is kept in memory for the life of the process.
+    """
+    path = cache_path(words, directory)
+    with _lock:
+        matrix = _matrices.get(path)
+        if matrix is not None:
+            return matrix
+
+        if os.path.exists(path):
+            try:
+                matrix = np.load(path, mmap_mode="r")
+                if matrix.shape != (len(words), len(words)):
+                    matrix = None
+            except (OSError, ValueError) as e:
+                logging.info(f"Ignoring unreadable Wordle pattern cache {path}: {e}")
+                matrix = None
+
+        if matrix is None:
+            started = time.perf_counter()
+            matrix = build_pattern_matrix(word_letters(words))
+            logging.info(f"Built Wordle pattern matrix {matrix.shape} in {time.perf_counter() - started:.1f}s")
+            try:
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, matrix)
+                os.replace(tmp_path, path)
+                matrix = np.load(path, mmap_mode="r")
+            except OSError as e:
+                logging.info(f"Could not write Wordle pattern cache {path}: {e}")
+
+        _matrices[path] = matrix
+        return matrix
+
+
+if __name__ == "__main__":
+    from wordle_solver import PATTERN_CACHE_DIR, word_list
+
+    started = time.perf_counter()
+    table = load_pattern_matrix(word_list, PATTERN_CACHE_DIR)
+    print(f"{cache_path(word_list, PATTERN_CACHE_DIR)}: {table.shape[0]}x{table.shape[1]} "
+          f"patterns ready in {time.perf_counter() - started:.1f}s")
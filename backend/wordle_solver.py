@@ -1,15 +1,58 @@
-from flask import jsonify
+from flask import Response, jsonify, stream_with_context
 from collections import Counter
+import json
+import logging
+import os
+
+import numpy as np
+
+import green
+from lru_cache import LRUCache
+from wordle_index import LetterIndex
+from wordle_patterns import encode_feedback, letter_counts, load_pattern_matrix, partition_entropy, pattern_block, word_letters, words_digest
+from wordle_tree import load_tree, walk_tree
+from wordle_words import WORDS_PATH, WordList
 
 TOP_N_DEFAULT = 9
 
-# Load the word list on module load
-with open("words.txt", "r") as file:
-    word_list = [
-        line.strip().lower()
-        for line in file
-        if len(line.strip()) == 5 and line.strip().isalpha()
-    ]
+# "frequency" ranks remaining words by letter coverage; "entropy" ranks every
+# allowed guess by the expected information of its feedback; "tree" follows a
+# precomputed decision tree (see wordle_tree.py) and falls back to entropy.
+STRATEGIES = ("frequency", "entropy", "tree")
+STRATEGY_DEFAULT = os.environ.get("WORDLE_STRATEGY", "frequency")
+
+# Openers with decision trees, built offline with `python wordle_tree.py`
+TREE_OPENERS = [w.strip().lower() for w in os.environ.get("WORDLE_TREE_OPENERS", "crane,slate,adieu").split(",") if w.strip()]
+
+# Entropy is estimated on an evenly spaced sample when more answers remain
+ENTROPY_SAMPLE_SIZE = int(os.environ.get("WORDLE_ENTROPY_SAMPLE", "1000"))
+
+# Repeat states (popular openers + common feedback) are served from memory.
+# Candidate sets are cached per history prefix so longer histories extend them.
+CACHE_TTL = float(os.environ.get("WORDLE_CACHE_TTL", "3600"))
+RESULT_CACHE_SIZE = int(os.environ.get("WORDLE_RESULT_CACHE_SIZE", "4096"))
+CANDIDATE_CACHE_SIZE = int(os.environ.get("WORDLE_CANDIDATE_CACHE_SIZE", "1024"))
+
+# Upper bound on game states per /api/wordle/solve_batch request. Entropy
+# states cost ~50 ms each (vs well under 1 ms for frequency), so "entropy" and
+# "tree" (which may fall back to entropy) batches get a lower cap.
+BATCH_MAX = int(os.environ.get("WORDLE_BATCH_MAX", "1000"))
+ENTROPY_BATCH_MAX = int(os.environ.get("WORDLE_ENTROPY_BATCH_MAX", "100"))
+
+# Where the precomputed guess x answer pattern table is cached (see wordle_patterns.py)
+PATTERN_CACHE_DIR = os.environ.get("WORDLE_CACHE_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+# Packed word list next to this module; words.txt is only read on first use
+word_list = WordList(WORDS_PATH)
+
+_result_cache = LRUCache(RESULT_CACHE_SIZE, ttl=CACHE_TTL)
+_candidate_cache = LRUCache(CANDIDATE_CACHE_SIZE, ttl=CACHE_TTL)
+_prefix_hits = 0
+_pattern_matrix = None
+_pattern_loading = False
+_counts = None
+_letter_index = None
+_words_digest = None
 
 def normalize_guess(g: str) -> str:
     g = (g or "").strip().lower()
@@ -74,38 +117,315 @@ def matches_feedback(candidate: str, guess: str, feedback: str) -> bool:
     # Compare the real Wordle feedback to the user-provided feedback
     return wordle_feedback(candidate, guess) == feedback
 
+def letter_index() -> LetterIndex:
+    """
+    The bit-packed letter-constraint index over word_list, built on first use.
+    """
+    global _letter_index
+    if _letter_index is None:
+        _letter_index = LetterIndex(word_list.letters)
+    return _letter_index
+
+PATTERNS_LOADING_ERROR = "The Wordle pattern table is still loading. Try again shortly."
+
+
+class PatternsLoading(Exception):
+    """The pattern table is still being loaded by warm_pattern_matrix()."""
+
+
+def pattern_matrix() -> np.ndarray:
+    """
+    The guess x answer pattern table for word_list, loaded on first use
+    unless warm_pattern_matrix() is loading it in the background.
+    """
+    global _pattern_matrix
+    if _pattern_matrix is None:
+        if _pattern_loading:
+            raise PatternsLoading(PATTERNS_LOADING_ERROR)
+        _pattern_matrix = load_pattern_matrix(word_list, PATTERN_CACHE_DIR)
+    return _pattern_matrix
+
+def patterns_ready() -> bool:
+    return _pattern_matrix is not None or not _pattern_loading
+
+def _load_pattern_matrix():
+    global _pattern_matrix, _pattern_loading
+    try:
+        _pattern_matrix = load_pattern_matrix(word_list, PATTERN_CACHE_DIR)
+    except Exception as e:
+        # Leave it to the first request to try again
+        logging.exception("Failed to load Wordle pattern table: %s", e)
+    finally:
+        _pattern_loading = False
+
+def warm_pattern_matrix() -> None:
+    """
+    Load (or build, ~15 s) the pattern table on a background OS thread at
+    startup. Until it is ready, frequency requests compute patterns on the fly
+    and entropy requests raise PatternsLoading.
+    """
+    global _pattern_loading
+    if _pattern_matrix is None and not _pattern_loading:
+        _pattern_loading = True
+        green.start_os_thread(_load_pattern_matrix, name="wordle-patterns")
+
+def guess_patterns(guess: str, indices: np.ndarray) -> np.ndarray:
+    """
+    Pattern codes of `guess` against the word_list entries at `indices`.
+    Guesses from the word list are a row lookup in the pattern table; anything
+    else, or any guess while the table is loading, is computed on the fly
+    with the same vectorized kernel.
+    """
+    global _counts
+
+    row = word_list.find(guess)
+    if row is not None and patterns_ready():
+        return pattern_matrix()[row, indices]
+    if _counts is None:
+        _counts = letter_counts(word_list.letters)
+    return pattern_block(word_letters([guess]), word_list.letters[indices], _counts[indices])[0]
+
+def filter_indices(guesses, feedbacks, indices=None) -> np.ndarray:
+    """
+    Return the word_list indices consistent with every (guess, feedback) pair.
+    The bit-packed letter index prunes first, so exact patterns are only
+    looked up for the survivors.
+    """
+    mask = letter_index().mask(guesses, feedbacks)
+    indices = np.flatnonzero(mask) if indices is None else indices[mask[indices]]
+    for guess, feedback in zip(guesses, feedbacks):
+        if len(indices) == 0:
+            break
+        indices = indices[guess_patterns(guess, indices) == encode_feedback(feedback)]
+    return indices
+
+def cached_candidates(history: tuple) -> np.ndarray:
+    """
+    Candidate indices for a normalized ((guess, feedback), ...) history.
+    On a miss, filtering resumes from the longest cached prefix and every
+    longer prefix is cached on the way, so a 3-guess history reuses the
+    candidate set of its 2-guess prefix.
+    """
+    global _prefix_hits
+
+    indices = _candidate_cache.get(history)
+    if indices is not None:
+        return indices
+
+    done = 0
+    for k in range(len(history) - 1, 0, -1):
+        indices = _candidate_cache.peek(history[:k])
+        if indices is not None:
+            done = k
+            _prefix_hits += 1
+            break
+
+    for k in range(done, len(history)):
+        guess, feedback = history[k]
+        indices = filter_indices([guess], [feedback], indices).astype(np.min_scalar_type(len(word_list)))
+        indices.setflags(write=False)
+        _candidate_cache.set(history[:k + 1], indices)
+    return indices
+
+def cache_stats():
+    return {
+        "results": _result_cache.stats(),
+        "candidates": {**_candidate_cache.stats(), "prefix_hits": _prefix_hits},
+    }
+
+def clear_caches():
+    _result_cache.clear()
+    _candidate_cache.clear()
+
+def tree_node(history_key: tuple):
+    """
+    Decision-tree node for a history that starts with a built opener and has
+    followed the tree's suggestions so far, else None.
+    """
+    global _words_digest
+
+    opener = history_key[0][0]
+    if opener not in TREE_OPENERS:
+        return None
+    if _words_digest is None:
+        _words_digest = words_digest(word_list)
+    tree = load_tree(PATTERN_CACHE_DIR, _words_digest, opener)
+    return walk_tree(tree, history_key) if tree else None
+
 def filter_words(words, guesses, feedbacks):
+    if words is word_list:
+        return [word_list[i] for i in filter_indices(guesses, feedbacks)]
+    letters = word_letters(words)
+    keep = np.ones(len(words), dtype=bool)
     for guess, feedback in zip(guesses, feedbacks):
-        words = [w for w in words if matches_feedback(w, guess, feedback)]
-    return words
+        keep &= pattern_block(word_letters([guess]), letters)[0] == encode_feedback(feedback)
+    return [w for w, k in zip(words, keep) if k]
 
-def process_wordle_request(data):
-    history = data.get("history", [])
-    top_n = int(data.get("top_n", TOP_N_DEFAULT))
+def entropy_scores(candidates: np.ndarray) -> np.ndarray:
+    """
+    Expected information in bits of every word_list guess over the remaining
+    candidates, i.e. the entropy of the partition its feedback patterns induce.
+    """
+    if len(candidates) > ENTROPY_SAMPLE_SIZE:
+        candidates = candidates[np.linspace(0, len(candidates) - 1, ENTROPY_SAMPLE_SIZE).astype(np.intp)]
+    return partition_entropy(np.take(np.asarray(pattern_matrix()), candidates, axis=1))
+
+def score_entropy(candidates: np.ndarray, limit: int = None):
+    """
+    Rank all allowed guesses by entropy, preferring a word that could still be
+    the answer when the information is equal. Guesses that reveal nothing and
+    cannot win are dropped.
+    """
+    if len(candidates) == 0:
+        return []
+    scores = entropy_scores(candidates)
+    is_candidate = np.zeros(len(word_list), dtype=bool)
+    is_candidate[candidates] = True
+    order = np.lexsort((~is_candidate, -scores))
+    order = order[is_candidate[order] | (scores[order] > 0)][:limit]
+    return [(word_list[i], round(float(scores[i]), 4)) for i in order]
 
-    if not history or not all(isinstance(pair, list) and len(pair) == 2 for pair in history):
-        return jsonify({"error": "Invalid input format. Expecting list of [guess, feedback] pairs."}), 400
+def parse_history(history):
+    """
+    Normalize and validate a list of [guess, feedback] pairs.
+
+    Returns:
+        tuple: (history_key, error) where history_key is a tuple of
+        (guess, feedback) tuples, or None with an error message.
+    """
+    if not history or not isinstance(history, list) or not all(
+        isinstance(pair, list) and len(pair) == 2 and isinstance(pair[0], str) and isinstance(pair[1], str)
+        for pair in history
+    ):
+        return None, "Invalid input format. Expecting list of [guess, feedback] pairs."
 
     guesses = [normalize_guess(pair[0]) for pair in history]
     feedbacks = [normalize_feedback(pair[1]) for pair in history]
 
     # Validate inputs
     for g, f in zip(guesses, feedbacks):
-        if len(g) != 5 or not g.isalpha():
-            return jsonify({"error": "Each guess must be exactly 5 letters (a-z)."}), 400
+        if len(g) != 5 or not (g.isascii() and g.isalpha()):
+            return None, "Each guess must be exactly 5 letters (a-z)."
         if len(f) != 5 or any(c not in "byg" for c in f):
-            return jsonify({"error": "Each feedback must be 5 chars using only b/y/g."}), 400
+            return None, "Each feedback must be 5 chars using only b/y/g."
+
+    return tuple(zip(guesses, feedbacks)), None
+
+def parse_options(data):
+    """
+    Read top_n and strategy from a request body; returns (top_n, strategy, error).
+    """
+    top_n = int(data.get("top_n", TOP_N_DEFAULT))
+    strategy = str(data.get("strategy") or STRATEGY_DEFAULT).strip().lower()
+
+    if strategy not in STRATEGIES:
+        return top_n, strategy, f"Unknown strategy. Expecting one of: {', '.join(STRATEGIES)}."
+    return top_n, strategy, None
+
+def solve_state(history_key: tuple, top_n: int, strategy: str) -> dict:
+    """
+    Suggestions for a validated history, served from the result cache when possible.
+    """
+    cache_key = (history_key, top_n, strategy)
+    payload = _result_cache.get(cache_key)
+    if payload is not None:
+        return payload
+
+    if strategy == "tree":
+        node = tree_node(history_key)
+        if node is not None:
+            payload = {
+                "remaining_count": node[1],
+                "strategy": "tree",
+                # Expected guesses left to solve, including this one
+                "top_suggestions": [{"word": node[0], "score": round(node[2] / node[1], 4)}]
+            }
+            _result_cache.set(cache_key, payload)
+            return payload
+
+    # Off-tree (or already solved) states are scored by entropy, but still
+    # reported as the tree strategy the client asked for
+    scoring = "entropy" if strategy == "tree" else strategy
 
     # Filter candidates using Wordle-accurate scoring
-    filtered_words = filter_words(word_list, guesses, feedbacks)
+    candidates = cached_candidates(history_key)
+    filtered_words = [word_list[i] for i in candidates]
 
-    # Score remaining words
-    freq = calculate_letter_frequency(filtered_words)
-    scored_words = score_words(filtered_words, freq)
+    # Score remaining words (or every allowed guess, for entropy)
+    if scoring == "entropy":
+        scored_words = score_entropy(candidates, limit=top_n)
+    else:
+        freq = calculate_letter_frequency(filtered_words)
+        scored_words = score_words(filtered_words, freq)
 
     top_suggestions = [{"word": w, "score": s} for w, s in scored_words[:top_n]]
 
-    return jsonify({
+    payload = {
         "remaining_count": len(filtered_words),
+        "strategy": strategy,
+        **({"fallback": scoring} if scoring != strategy else {}),
         "top_suggestions": top_suggestions
-    })
+    }
+    _result_cache.set(cache_key, payload)
+    return payload
+
+def process_wordle_request(data):
+    top_n, strategy, error = parse_options(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    history_key, error = parse_history(data.get("history", []))
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        return jsonify(solve_state(history_key, top_n, strategy))
+    except PatternsLoading as e:
+        return jsonify({"error": str(e)}), 503
+
+def solve_batch(histories, top_n: int, strategy: str):
+    """
+    Yield (index, result) for each history. States are solved in sorted order
+    so histories sharing a prefix run back to back and reuse its cached
+    candidate set; `index` is the position in the request. Yields to other
+    green threads between states, as the loop is CPU-bound.
+    """
+    parsed = [parse_history(history) for history in histories]
+    order = sorted(range(len(parsed)), key=lambda i: parsed[i][0] or ())
+    for i in order:
+        green.sleep(0)
+        history_key, error = parsed[i]
+        if error:
+            yield i, {"error": error}
+        else:
+            yield i, solve_state(history_key, top_n, strategy)
+
+def process_wordle_batch(data):
+    """
+    Solve many game states in one request. Returns {"results": [...]} in
+    request order, or NDJSON lines ({"index": i, ...}) as each state is solved
+    when "stream" is true. Invalid histories get a per-item "error".
+    """
+    top_n, strategy, error = parse_options(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    histories = data.get("histories")
+    if not isinstance(histories, list) or not histories:
+        return jsonify({"error": "Invalid input format. Expecting histories: list of histories."}), 400
+    limit = BATCH_MAX if strategy == "frequency" else min(BATCH_MAX, ENTROPY_BATCH_MAX)
+    if len(histories) > limit:
+        return jsonify({"error": f"Too many histories for strategy {strategy} (max {limit})."}), 400
+    if strategy != "frequency" and not patterns_ready():
+        return jsonify({"error": PATTERNS_LOADING_ERROR}), 503
+
+    if data.get("stream"):
+        def generate():
+            for i, result in solve_batch(histories, top_n, strategy):
+                yield json.dumps({"index": i, **result}) + "\n"
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    results = [None] * len(histories)
+    for i, result in solve_batch(histories, top_n, strategy):
+        results[i] = result
+    return jsonify({"results": results})
@@ -0,0 +1,200 @@
+"""
+Offline Wordle decision trees.
+
+A tree fixes the opener and stores the entropy-best next guess for every
+feedback path reachable over words.txt, so a solve request that follows it is
+a walk of O(depth) dict lookups instead of filtering and scoring. Trees are
+saved as compact JSON next to words.txt, one file per opener.
+
+Each node is a list: [guess, remaining, total_guesses, {feedback: child}]
+where `remaining` is the number of possible answers at the node and
+`total_guesses` is the sum, over those answers, of guesses from here to solve.
+
+Build (uses all cores by default) and report average guesses:
+
+    python wordle_tree.py crane slate adieu
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from wordle_patterns import ALL_GREEN, decode_pattern, load_pattern_matrix, partition_entropy, words_digest
+from wordle_words import WordList
+
+FORMAT_VERSION = 1
+
+_worker = {}  # per-process state set up by _init_worker()
+_trees = {}  # tree path -> loaded root node (or None if missing/stale)
+
+
+def tree_path(directory: str, digest: str, opener: str) -> str:
+    return os.path.join(directory, f"words.{digest}.tree.{opener}.json")
+
+
+def best_guess(codes: np.ndarray, candidates: np.ndarray) -> int:
+    """
+    Row of `codes` (all guesses x `candidates` pattern codes) with the highest
+    partition entropy, preferring a guess that could itself be the answer.
+    """
+    if len(candidates) <= 2:
+        return int(candidates[0])
+    scores = partition_entropy(codes)
+    is_candidate = np.zeros(len(codes), dtype=bool)
+    is_candidate[candidates] = True
+    return int(np.lexsort((~is_candidate, -scores))[0])
+
+
+def build_subtree(words, codes: np.ndarray, candidates: np.ndarray, local: np.ndarray) -> list:
+    """
+    Decision tree for the answers `candidates[local]`, where `codes` holds the
+    pattern columns of every guess against `candidates`.
+    """
+    sub_codes = codes[:, local]
+    guess = best_guess(sub_codes, candidates[local])
+    row = sub_codes[guess]
+
+    children = {}
+    total = len(local)
+    for code in np.unique(row):
+        if code == ALL_GREEN:
+            continue
+        child = build_subtree(words, codes, candidates, local[row == code])
+        children[decode_pattern(code)] = child
+        total += child[2]
+    return [words[guess], len(local), total, children]
+
+
+def _init_worker(text_path: str, cache_dir: str):
+    words = WordList(text_path)
+    _worker["words"] = words
+    _worker["matrix"] = load_pattern_matrix(words, cache_dir)
+
+
+def _build_branch(task):
+    feedback, candidates = task
+    codes = np.take(np.asarray(_worker["matrix"]), candidates, axis=1)
+    return feedback, build_subtree(_worker["words"], codes, candidates, np.arange(len(candidates)))
+
+
+def build_tree(words, cache_dir: str, opener: str, workers: int = None) -> list:
+    """
+    Build the full decision tree for `opener`, one pool task per first
+    feedback, largest branches first.
+    """
+    matrix = load_pattern_matrix(words, cache_dir)
+    opener_row = words.find(opener)
+    if opener_row is None:
+        raise ValueError(f"Opener {opener!r} is not in the word list")
+
+    row = np.asarray(matrix[opener_row])
+    tasks = [
+        (decode_pattern(code), np.flatnonzero(row == code))
+        for code in np.unique(row) if code != ALL_GREEN
+    ]
+    tasks.sort(key=lambda task: len(task[1]), reverse=True)
+
+    children = {}
+    total = len(words)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(words.text_path, cache_dir)) as pool:
+        for feedback, child in pool.imap_unordered(_build_branch, tasks):
+            children[feedback] = child
+            total += child[2]
+    return [opener, len(words), total, children]
+
+
+def save_tree(tree: list, path: str, digest: str, build_seconds: float):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({
+            "version": FORMAT_VERSION,
+            "words_digest": digest,
+            "build_seconds": round(build_seconds, 1),
+            "tree": tree,
+        }, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def load_tree(directory: str, digest: str, opener: str):
+    """
+    Root node for `opener`, or None if no tree was built for this word list.
+    Loaded once per process.
+    """
+    path = tree_path(directory, digest, opener)
+    if path not in _trees:
+        tree = None
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == FORMAT_VERSION and data.get("words_digest") == digest:
+                tree = data["tree"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logging.info(f"Ignoring unreadable Wordle tree {path}: {e}")
+        _trees[path] = tree
+    return _trees[path]
+
+
+def walk_tree(tree: list, history: tuple):
+    """
+    Node reached by following `history` ((guess, feedback), ...) from the
+    root, or None if the history leaves the tree or the game is already won.
+    """
+    node = tree
+    for guess, feedback in history:
+        if node is None or node[0] != guess:
+            return None
+        node = node[3].get(feedback)
+    return node
+
+
+def tree_stats(tree: list) -> dict:
+    depths = {}
+
+    def visit(node, depth):
+        # Answers solved at this node are those not passed on to a child
+        solved_here = node[1] - sum(child[1] for child in node[3].values())
+        if solved_here:
+            depths[depth] = depths.get(depth, 0) + solved_here
+        for child in node[3].values():
+            visit(child, depth + 1)
+
+    visit(tree, 1)
+    return {
+        "answers": tree[1],
+        "average_guesses": round(tree[2] / tree[1], 4),
+        "max_guesses": max(depths),
+        "distribution": dict(sorted(depths.items())),
+    }
+
+
+def main():
+    from wordle_solver import PATTERN_CACHE_DIR, TREE_OPENERS, word_list
+
+    parser = argparse.ArgumentParser(description="Precompute Wordle decision trees.")
+    parser.add_argument("openers", nargs="*", default=TREE_OPENERS, help="opening guesses (default: WORDLE_TREE_OPENERS)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    digest = words_digest(word_list)
+    load_pattern_matrix(word_list, PATTERN_CACHE_DIR)  # build the table once, before forking
+    for opener in args.openers:
+        started = time.perf_counter()
+        tree = build_tree(word_list, PATTERN_CACHE_DIR, opener.strip().lower(), workers=args.workers)
+        elapsed = time.perf_counter() - started
+        path = tree_path(PATTERN_CACHE_DIR, digest, tree[0])
+        save_tree(tree, path, digest, elapsed)
+        stats = tree_stats(tree)
+        print(f"{tree[0]}: built in {elapsed:.1f}s, {stats['answers']} answers, "
+              f"average {stats['average_guesses']} guesses, worst {stats['max_guesses']}")
+        print(f"  distribution: {stats['distribution']}")
+        print(f"  saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Compact Wordle word list.
+
+words.txt is compiled once into words.bin: fixed-width 5-byte ASCII records in
+a single buffer, memory-mapped on load. That is ~74 KB for the whole list
+instead of ~15k separate str objects, and nothing is read until the list is
+first used. words.bin is rebuilt whenever words.txt is newer.
+"""
+import logging
+import mmap
+import os
+from collections.abc import Sequence
+
+import numpy as np
+
+import green
+
+WORD_LENGTH = 5
+WORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "words.txt")
+
+
+def compile_words(text_path: str) -> bytes:
+    """
+    Read a one-word-per-line file into packed lowercase 5-byte records.
+    """
+    records = bytearray()
+    with open(text_path, "r") as file:
+        for line in file:
+            word = line.strip().lower()
+            if len(word) == WORD_LENGTH and word.isascii() and word.isalpha():
+                records += word.encode("ascii")
+    return bytes(records)
+
+
+def load_records(text_path: str) -> bytes:
+    """
+    Return the packed records for `text_path`, memory-mapped from the compiled
+    .bin next to it. Falls back to compiling in memory if it can't be written.
+    """
+    bin_path = os.path.splitext(text_path)[0] + ".bin"
+    try:
+        stale = os.path.getmtime(bin_path) < os.path.getmtime(text_path)
+    except OSError:
+        stale = True
+
+    if stale:
+        records = compile_words(text_path)
+        try:
+            tmp_path = f"{bin_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(records)
+            os.replace(tmp_path, bin_path)
+        except OSError as e:
+            logging.info(f"Could not write compiled word list {bin_path}: {e}")
+            return records
+
+    with open(bin_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class WordList(Sequence):
+    """
+    Read-only sequence of 5-letter words backed by one packed buffer.
+    Items are decoded to str on access; the file is loaded on first use.
+    """
+
+    def __init__(self, text_path: str = WORDS_PATH):
+        self.text_path = text_path
+        self._records = None
+        self._sorted = None  # (records in sorted order as S5, their positions)
+        self._letters = None
+        self._lock = green.OSLock()  # also taken by warm_pattern_matrix()'s OS thread
+
+    @property
+    def records(self):
+        if self._records is None:
+            with self._lock:
+                if self._records is None:
+                    self._records = load_records(self.text_path)
+        return self._records
+
+    def __len__(self):
+        return len(self.records) // WORD_LENGTH
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("word index out of range")
+        start = i * WORD_LENGTH
+        return self.records[start:start + WORD_LENGTH].decode("ascii")
+
+    def __iter__(self):
+        records = self.records
+        for start in range(0, len(records), WORD_LENGTH):
+            yield records[start:start + WORD_LENGTH].decode("ascii")
+
+    def __contains__(self, word):
+        return self.find(word) is not None
+
+    def find(self, word: str):
+        """
+        Position of `word` in the list, or None. Binary search over a sorted
+        view, so no per-word dict is kept.
+        """
+        if not isinstance(word, str) or len(word) != WORD_LENGTH or not word.isascii():
+            return None
+        if self._sorted is None:
+            packed = np.frombuffer(self.records, dtype=f"S{WORD_LENGTH}")
+            order = np.argsort(packed, kind="stable")
+            self._sorted = (packed[order], order)
+        words, order = self._sorted
+        key = np.bytes_(word.encode("ascii"))
+        pos = int(np.searchsorted(words, key))
+        if pos < len(words) and words[pos] == key:
+            return int(order[pos])
+        return None
+
+    @property
+    def letters(self) -> np.ndarray:
+        """
+        (N, 5) uint8 array of letter indices (a=0 .. z=25), as word_letters().
+        """
+        if self._letters is None:
+            raw = np.frombuffer(self.records, dtype=np.uint8)
+            self._letters = (raw - ord("a")).reshape(-1, WORD_LENGTH)
+        return self._letters
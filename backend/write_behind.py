@@ -0,0 +1,137 @@
+"""
+Write-behind queue: callers hand rows off and return immediately, and a
+background green thread writes them in batches once `max_batch` rows are
+waiting or `flush_interval` seconds have passed since the first one.
+"""
+import atexit
+import logging
+import time
+
+import green
+
+
+class WriteBehindQueue:
+    """
+    Args:
+        write_batch (callable): Persists a list of rows; raising counts them as failed.
+        max_batch (int): Rows written per batch at most.
+        flush_interval (float): Seconds a row may wait before its batch is written.
+        max_backlog (int): Rows that may be queued; submit() refuses more.
+    """
+
+    def __init__(self, write_batch, max_batch=50, flush_interval=0.5, max_backlog=1000):
+        self._write_batch = write_batch
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_backlog = max_backlog
+
+        self._queue = green.Queue(max_backlog)
+        self._lock = green.Lock()
+        self._unwritten = []  # submitted rows not yet confirmed written, oldest first
+        self._worker = None
+        self._closed = False
+
+        self.submitted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.last_batch_ms = 0.0
+
+        atexit.register(self.close)
+
+    def submit(self, row) -> bool:
+        """
+        Queue a row for writing. Returns False if the backlog is full or the
+        queue is closed, in which case the caller should write it itself.
+        """
+        if self._closed:
+            return False
+        if self._worker is None:
+            self._worker = green.spawn(self._run)
+        with self._lock:
+            try:
+                self._queue.put_nowait(row)
+            except green.Full:
+                self.rejected += 1
+                return False
+            self._unwritten.append(row)
+            self.submitted += 1
+        return True
+
+    def unwritten(self):
+        """
+        Snapshot of rows submitted but not yet written, oldest first.
+        """
+        with self._lock:
+            return list(self._unwritten)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except green.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        started = time.monotonic()
+        try:
+            self._write_batch(batch)
+            self.rows_written += len(batch)
+        except Exception as e:
+            self.rows_failed += len(batch)
+            logging.info(f"Write-behind batch of {len(batch)} rows failed: {e}")
+        self.batches += 1
+        self.last_batch_ms = round((time.monotonic() - started) * 1000, 3)
+        with self._lock:
+            written = {id(row) for row in batch}
+            self._unwritten = [row for row in self._unwritten if id(row) not in written]
+
+    def _run(self):
+        while not self._closed:
+            self._write(self._next_batch())
+
+    def flush(self):
+        """
+        Write everything queued right now, in the calling thread.
+        """
+        while True:
+            batch = []
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except green.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self, timeout=5.0):
+        """
+        Stop accepting rows, flush the backlog and give a batch the worker is
+        already writing up to `timeout` seconds to finish (registered with atexit).
+        """
+        self._closed = True
+        self.flush()
+        deadline = time.monotonic() + timeout
+        while self._unwritten and time.monotonic() < deadline:
+            green.sleep(0.05)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "unwritten": len(self._unwritten),
+            "max_backlog": self.max_backlog,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "last_batch_ms": self.last_batch_ms,
+        }